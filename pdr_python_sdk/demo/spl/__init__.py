@@ -2,3 +2,5 @@ from .batch_foobar import *
 from .chunk_foobar import *
 from .streaming_replacehello import *
 from .generating_generatehello import *
+from .reduce_sum import *
+from .dataframe_foobar import *
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+
+import sys
+
+from pdr_python_sdk.spl import SplDataFrameBatchCommand
+from pdr_python_sdk.on_demand_action import run
+
+
+class DataFrameFoobar(SplDataFrameBatchCommand):
+    def dataframe_handle(self, df):
+        df['foo'] = 'bar'
+        return df
+
+
+if __name__ == '__main__':
+    run(DataFrameFoobar, sys.argv, sys.stdin.buffer, sys.__stdout__.buffer)
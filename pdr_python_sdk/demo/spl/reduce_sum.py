@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+import sys
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.on_demand_action import run
+
+
+class SumByKey(SplReducingCommand):
+    def init_env_by_getinfo(self):
+        self.args = self.metainfo["searchinfo"]["args"]
+        if len(self.args) < 2:
+            raise RuntimeError('usage: sumbykey <key field> <value field>')
+        self.key, self.value = self.args[0], self.args[1]
+
+    def reduce(self, state, lines):
+        for line in lines:
+            key = line.get(self.key, '')
+            state[key] = state.get(key, 0) + float(line.get(self.value) or 0)
+        return state
+
+    def finalize(self, state):
+        return [{self.key: key, 'sum': total} for key, total in state.items()]
+
+
+if __name__ == '__main__':
+    run(SumByKey, sys.argv, sys.stdin.buffer, sys.__stdout__.buffer)
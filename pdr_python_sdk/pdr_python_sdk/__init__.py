@@ -1,9 +1,81 @@
+from importlib import import_module as _import_module
+
 from .on_demand_action import *
 from .spl import *
-from .storage import *
-from .client import *
 from .entity import *
 from .errors import *
-from .manager import *
+
+# names bound by the eager imports above, __all__ adds the lazy ones
+_EAGER_NAMES = [name for name in globals() if not name.startswith('_')]
+
+# submodules which pull in heavy dependencies (urllib3, pandas, numpy), imported
+# with the names they export on first access instead of with the package
+_LAZY_SUBMODULES = ('storage', 'client', 'manager', 'schedule')
+# the names those submodules export, each imported from its submodule on first
+# access
+_LAZY_ATTRS = {
+    'connect': 'client',
+    'Service': 'storage',
+    'LookupCache': 'storage',
+    'StorageLookup': 'storage',
+    'urlencode': 'client',
+    'Job': 'client',
+    'DEFAULT_HOST': 'client',
+    'DEFAULT_PORT': 'client',
+    'DEFAULT_SCHEME': 'client',
+    'API_ROOT_PREFIX': 'client',
+    'DEFAULT_CONTENT_TYPE_KEY': 'client',
+    'DEFAULT_CONTENT_TYPE_VALUE': 'client',
+    'TOKEN_AUTH_HEADER_KEY': 'client',
+    'TOKEN_SESSION_HEADER_KEY': 'client',
+    'DEFAULT_ENCODING': 'client',
+    'PATH_DATA_UPLOAD': 'client',
+    'PATH_SPL_QUERY_JOB': 'client',
+    'PATH_SPL_QUERY_JOB_STATUS': 'client',
+    'PATH_SPL_QUERY_JOB_EVENTS': 'client',
+    'PATH_SPL_QUERY_JOB_TIMELINE': 'client',
+    'PATH_SPL_QUERY_JOB_SUMMARY': 'client',
+    'PATH_SPL_QUERY_JOB_RESULTS': 'client',
+    'PATH_SPL_QUERY_MAPPING': 'client',
+    'PATH_REPOS': 'client',
+    'PATH_SINGLE_REPO': 'client',
+    'PATH_SOURCETYPE': 'client',
+    'PATH_SINGLE_SOURCETYPE': 'client',
+    'APP_IMPORT': 'client',
+    'APP_UNINSTALL': 'client',
+    'APP_ENABLE': 'client',
+    'APP_DISABLE': 'client',
+    'APP_CHUNK_SIZE': 'client',
+    'EXPORT_TASK': 'client',
+    'EXPORT_TASK_LIST': 'client',
+    'EXPORT_SINGLE_TASK': 'client',
+    'EXPORT_TASKS_STATUS': 'client',
+    'EXPORT_SINGLE_TASK_HISTORY': 'client',
+    'JOB_REGISTER': 'client',
+    'JOB_UPDATE': 'client',
+    'JOB_QUERY': 'client',
+    'JOB_DELETE': 'client',
+    'PandoraConnection': 'client',
+    'encode_json': 'client',
+    'decode_json': 'client',
+    'SearchManager': 'manager',
+    'DataManager': 'manager',
+    'merge_result': 'manager',
+    'is_legal_timestamp': 'manager',
+}
+
+__all__ = _EAGER_NAMES + list(_LAZY_SUBMODULES) + list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return _import_module('.' + name, __name__)
+    if name in _LAZY_ATTRS:
+        value = getattr(_import_module('.' + _LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
 
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_SUBMODULES) | set(_LAZY_ATTRS))
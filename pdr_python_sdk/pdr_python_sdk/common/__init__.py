@@ -1 +1,3 @@
 from .logging import *
+from .recording import *
+from .classes import *
@@ -0,0 +1,24 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import importlib
+
+
+def load_class(name):
+    """
+    Load a class from "package.module:Class" or "package.module.Class"
+    """
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        module_name, _, class_name = name.rpartition('.')
+    return getattr(importlib.import_module(module_name), class_name)
@@ -0,0 +1,109 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+import time
+
+# directory run() records the exact input and output byte streams of every request to
+RECORD_DIR_ENV = 'PANDORA_RECORD_DIR'
+
+RECORDING_INPUT_SUFFIX = '.in'
+RECORDING_OUTPUT_SUFFIX = '.out'
+
+
+class TeeStream(object):
+    """
+    Binary stream wrapper copying every byte read from or written to stream into copy
+
+    It has no fileno on purpose, so writers cannot go around the copy.
+    """
+
+    def __init__(self, stream, copy):
+        self.stream = stream
+        self.copy = copy
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.copy.write(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.stream.readline(size)
+        self.copy.write(data)
+        return data
+
+    def readinto(self, buffer):
+        count = self.stream.readinto(buffer)
+        if count:
+            self.copy.write(memoryview(buffer)[:count])
+        return count
+
+    def readinto1(self, buffer):
+        if hasattr(self.stream, 'readinto1'):
+            count = self.stream.readinto1(buffer)
+        else:
+            count = self.stream.readinto(buffer)
+        if count:
+            self.copy.write(memoryview(buffer)[:count])
+        return count
+
+    def write(self, data):
+        count = self.stream.write(data)
+        self.copy.write(data)
+        return count
+
+    def flush(self):
+        self.stream.flush()
+        self.copy.flush()
+
+    def close(self):
+        self.copy.close()
+
+
+def _create_private(path):
+    """
+    Create path for writing, readable by its owner only, failing when it exists
+    """
+    return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb')
+
+
+def open_recording(input_stream, output_stream, record_dir=None):
+    """
+    Tee input_stream and output_stream into a new recording in record_dir
+
+    The recording is a pair of files holding the raw input and output bytes,
+    <name>.in and <name>.out. They hold the session key of the getinfo meta
+    and search data, so only their owner may read them.
+
+    :return: ``(input_stream, output_stream, path)``, path being the recording name without suffix
+    """
+    if record_dir is None:
+        record_dir = os.environ[RECORD_DIR_ENV]
+    os.makedirs(record_dir, mode=0o700, exist_ok=True)
+    name = os.path.join(record_dir, '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+    path = name
+    attempt = 0
+    while True:
+        try:
+            input_copy = _create_private(path + RECORDING_INPUT_SUFFIX)
+            break
+        except FileExistsError:
+            # a recording of the same process in the same second
+            attempt += 1
+            path = '{}-{}'.format(name, attempt)
+    try:
+        output_copy = _create_private(path + RECORDING_OUTPUT_SUFFIX)
+    except Exception:
+        input_copy.close()
+        raise
+    return TeeStream(input_stream, input_copy), TeeStream(output_stream, output_copy), path
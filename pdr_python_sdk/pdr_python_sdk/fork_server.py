@@ -0,0 +1,214 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Fork server for on demand actions
+
+A resident process imports the action class once and listens on a Unix
+socket. Every invocation runs a thin launcher which sends its argv, working
+directory, environment and stdin, stdout and stderr descriptors over the
+socket, the server forks a warm worker which serves the request on those
+descriptors through on_demand_action.run, and the launcher exits with the
+worker's status. A worker exits as soon as its launcher dies.
+
+    python -m pdr_python_sdk.fork_server serve package.module:Class /tmp/app.sock
+    python <site-packages>/pdr_python_sdk/fork_server.py launch /tmp/app.sock <app_root> [<log_dir>]
+
+Run by its path, the launcher only imports the standard library. With -m it
+imports the pdr_python_sdk package first, which costs tens of milliseconds.
+"""
+
+import array
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+
+_LENGTH = struct.Struct('!I')
+_STATUS = struct.Struct('!i')
+_FD_COUNT = 3
+
+
+def _recv_exact(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise RuntimeError('Fork server connection closed, {} bytes missing'.format(size - len(data)))
+        data += chunk
+    return data
+
+
+def _recv_request(conn):
+    """
+    Receive a launcher request
+
+    :return: ``(request, fds)``
+    """
+    fds = array.array('i')
+    data, ancdata, _, _ = conn.recvmsg(65536, socket.CMSG_LEN(_FD_COUNT * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+    if len(fds) != _FD_COUNT:
+        for fd in fds:
+            os.close(fd)
+        raise RuntimeError('Fork server expected {} descriptors, got {}'.format(_FD_COUNT, len(fds)))
+    if len(data) < _LENGTH.size:
+        data += _recv_exact(conn, _LENGTH.size - len(data))
+    length = _LENGTH.unpack(data[:_LENGTH.size])[0]
+    payload = data[_LENGTH.size:]
+    if len(payload) < length:
+        payload += _recv_exact(conn, length - len(payload))
+    return json.loads(payload.decode('utf-8')), list(fds)
+
+
+def _exit_with_launcher(conn):
+    """
+    Exit the worker when the launcher's end of conn closes
+
+    The launcher sends nothing after its request, so a read returns only once
+    it has exited: after the worker's status arrived, or because it died.
+    """
+    def watch():
+        try:
+            conn.recv(1)
+        except OSError:
+            pass
+        os._exit(1)
+
+    threading.Thread(target=watch, name='fork-server-launcher', daemon=True).start()
+
+
+def _run_worker(clz, conn, request, fds):
+    """
+    Serve one request in a forked worker, never returns
+    """
+    status = 1
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        sys.argv = request['argv']
+        _exit_with_launcher(conn)
+
+        from pdr_python_sdk.on_demand_action import run
+        run(clz, sys.argv, sys.stdin.buffer, sys.__stdout__.buffer)
+        status = 0
+    except BaseException as error:
+        sys.stderr.write('fork server worker failed: {}\n'.format(error))
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            conn.sendall(_STATUS.pack(status))
+        finally:
+            os._exit(status)
+
+
+def _reap():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _stop(signum, frame):
+    sys.exit(0)
+
+
+def serve(clz, socket_path, backlog=64):
+    """
+    Serve launcher requests for clz on the Unix socket at socket_path until SIGTERM
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(backlog)
+    listener.settimeout(1.0)
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        while True:
+            _reap()
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            fds = []
+            try:
+                request, fds = _recv_request(conn)
+                pid = os.fork()
+                if pid == 0:
+                    listener.close()
+                    _run_worker(clz, conn, request, fds)
+            except Exception as error:
+                sys.stderr.write('fork server failed to start worker: {}\n'.format(error))
+            finally:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def launch(socket_path, argv=None):
+    """
+    Hand this process's argv, environment and standard descriptors to the fork server
+
+    :return: the worker's exit status
+    """
+    if argv is None:
+        argv = sys.argv
+    payload = json.dumps({'argv': list(argv), 'cwd': os.getcwd(), 'env': dict(os.environ)}).encode('utf-8')
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        fds = array.array('i', [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+        conn.sendmsg([_LENGTH.pack(len(payload)) + payload], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        try:
+            return _STATUS.unpack(_recv_exact(conn, _STATUS.size))[0]
+        except RuntimeError:
+            return 1
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    if len(argv) >= 4 and argv[1] == 'serve':
+        from pdr_python_sdk.common.classes import load_class
+        serve(load_class(argv[2]), argv[3])
+        return 0
+    if len(argv) >= 3 and argv[1] == 'launch':
+        return launch(argv[2], [argv[0]] + argv[3:])
+    sys.stderr.write('usage: {0} serve <package.module:Class> <socket>\n'
+                     '       {0} launch <socket> [args...]\n'.format(argv[0]))
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
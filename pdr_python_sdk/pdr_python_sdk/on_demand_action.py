@@ -16,6 +16,7 @@ import sys
 import os
 
 from .common.logging import config_logging
+from .common.recording import RECORD_DIR_ENV, open_recording
 
 
 class OnDemandAction(object):
@@ -49,7 +50,16 @@ def run(clz, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdou
     logging.info('app root dir is: {}'.format(app_root_dir))
     logging.info('running script using class: [' + str(clz) + ']')
 
+    recording = None
+    if os.environ.get(RECORD_DIR_ENV):
+        input_stream, output_stream, recording = open_recording(input_stream, output_stream)
+        logging.info('recording request to: {}'.format(recording))
+
     try:
         clz().on_request(argv, input_stream, output_stream)
     except Exception as err:
         logging.exception(err)
+    finally:
+        if recording is not None:
+            input_stream.close()
+            output_stream.close()
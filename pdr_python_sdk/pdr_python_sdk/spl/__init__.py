@@ -1,5 +1,46 @@
+from importlib import import_module as _import_module
+
+from .spl_row import *
 from .spl_packet_utils import *
 from .spl_streaming_batch_command import *
 from .spl_streaming_chunk_command import *
 from .spl_streaming_command import *
 from .spl_generating_command import *
+from .spl_reducing_command import *
+from .spl_channel import *
+from .spl_spill import *
+from .spl_metrics import *
+from .spl_window_command import *
+
+# the columnar helpers, DataFrame commands and sketches need numpy or pandas,
+# and the asyncio command asyncio, they are imported on first access and are
+# not part of the star export
+_LAZY_ATTRS = {
+    'SplColumns': 'spl_columnar_utils',
+    'decode_column': 'spl_columnar_utils',
+    'raw_column': 'spl_columnar_utils',
+    'decode_body_columns': 'spl_columnar_utils',
+    'parse_body_columns': 'spl_columnar_utils',
+    'convert_columns_to_str': 'spl_columnar_utils',
+    'encode_binary_columns': 'spl_binary_columns',
+    'decode_binary_columns': 'spl_binary_columns',
+    'columns_to_dataframe': 'spl_dataframe_command',
+    'dataframe_to_columns': 'spl_dataframe_command',
+    'SplDataFrameCommand': 'spl_dataframe_command',
+    'SplDataFrameBatchCommand': 'spl_dataframe_command',
+    'SplDataFrameChunkCommand': 'spl_dataframe_command',
+    'AsyncSplChannel': 'spl_async_command',
+    'ThreadedSplChannel': 'spl_async_command',
+    'AsyncSplStreamingBatchCommand': 'spl_async_command',
+    'hash_values': 'spl_sketches',
+    'HyperLogLog': 'spl_sketches',
+    'CountMinSketch': 'spl_sketches',
+    'SpaceSaving': 'spl_sketches',
+    'KLLSketch': 'spl_sketches',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        return getattr(_import_module('.' + _LAZY_ATTRS[name], __name__), name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,320 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import stat
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from .spl_packet_utils import *
+from .spl_channel import SplChannel
+from .spl_metrics import *
+from .spl_streaming_batch_command import SplStreamingBatchCommand
+
+
+def _pipe_fileno(stream):
+    """
+    File descriptor of stream when asyncio can watch it, a pipe or a socket, None otherwise
+    """
+    try:
+        fd = stream.fileno()
+        mode = os.fstat(fd).st_mode
+    except (AttributeError, io.UnsupportedOperation, ValueError, OSError):
+        return None
+    if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode):
+        return fd
+    return None
+
+
+class AsyncSplChannel(object):
+    """
+    Spl chunked protocol endpoint over asyncio streams
+
+    The body of the last packet read is kept until the next one is read, for
+    iter_body.
+    """
+
+    def __init__(self, reader, writer, input_stream=None, output_stream=None):
+        self.reader = reader
+        self.writer = writer
+        self.input_stream = input_stream
+        self.output_stream = output_stream
+        self.body = b''
+        self.packet_length = 0
+        self.filenos = []
+
+    @classmethod
+    async def open(cls, input_stream, output_stream):
+        """
+        Connect asyncio streams to the descriptors of input_stream and output_stream
+
+        The descriptors are duplicated, closing the channel leaves the streams open.
+        """
+        loop = asyncio.get_running_loop()
+        in_fd = _pipe_fileno(input_stream)
+        out_fd = _pipe_fileno(output_stream)
+        output_stream.flush()
+        reader = asyncio.StreamReader(limit=BODY_READ_SIZE)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                     os.fdopen(os.dup(in_fd), 'rb', buffering=0))
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin,
+                                                            os.fdopen(os.dup(out_fd), 'wb', buffering=0))
+        channel = cls(reader, asyncio.StreamWriter(transport, protocol, reader, loop), input_stream, output_stream)
+        channel.filenos = [in_fd, out_fd]
+        return channel
+
+    async def _read_exactly(self, length):
+        try:
+            return await self.reader.readexactly(length)
+        except asyncio.IncompleteReadError as error:
+            raise RuntimeError('Unexpected end of stream, {} bytes missing'.format(
+                error.expected - len(error.partial)))
+
+    async def read_packet(self):
+        """
+        Read one packet
+
+        :return: ``(meta, body)``, meta is None when the packet has none
+        """
+        try:
+            header = await self.reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError:
+            raise RuntimeError('Unexpected end of stream while reading spl protocol header')
+        try:
+            parts = str.split(str(header[:-1], "utf-8"), ",")
+            meta_length, body_length = int(parts[1]), int(parts[2])
+        except Exception as error:
+            raise RuntimeError('Failed to read spl protocol header: {}'.format(error))
+        meta = None
+        if meta_length > 0:
+            data = await self._read_exactly(meta_length)
+            try:
+                meta = json.loads(str(data, "utf-8"))
+            except Exception as error:
+                raise RuntimeError('Failed to parser spl protocol meta: {}'.format(error))
+        self.body = await self._read_exactly(body_length) if body_length > 0 else b''
+        self.packet_length = meta_length + body_length
+        return meta, memoryview(self.body)
+
+    def iter_body(self, batch_size=None, compact=False, projection=None, keep_unrequested=True):
+        """
+        Parse the body returned by the last read_packet into records incrementally
+        """
+        return iter_body_buffer(self.body, 0, len(self.body), batch_size, compact, projection, keep_unrequested)
+
+    async def write(self, *parts):
+        self.writer.write(b''.join(parts))
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+        # the duplicated descriptors share the non-blocking flag with the originals
+        for fd in self.filenos:
+            try:
+                os.set_blocking(fd, True)
+            except OSError:
+                pass
+
+
+class ThreadedSplChannel(object):
+    """
+    Awaitable wrapper of a blocking SplChannel, for streams asyncio cannot watch
+
+    Reads and writes run on an executor thread, the event loop keeps running
+    while they wait.
+    """
+
+    def __init__(self, input_stream, output_stream):
+        self.input_stream = input_stream
+        self.output_stream = output_stream
+        self.channel = SplChannel(input_stream, output_stream)
+        self.packet_length = 0
+
+    def _read_packet(self):
+        meta_length, body_length = self.channel.read_head()
+        meta = self.channel.read_meta(meta_length) if meta_length > 0 else None
+        body = self.channel.read_body(body_length)
+        self.packet_length = meta_length + body_length
+        return meta, body
+
+    async def read_packet(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self._read_packet)
+
+    def iter_body(self, batch_size=None, compact=False, projection=None, keep_unrequested=True):
+        return self.channel.iter_body(batch_size, compact, projection, keep_unrequested)
+
+    async def write(self, *parts):
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.channel.write, *parts))
+
+    def close(self):
+        return
+
+
+class AsyncSplStreamingBatchCommand(SplStreamingBatchCommand):
+    """
+    Batch command running the protocol loop on asyncio
+
+    streaming_handle may be a coroutine function. The default one awaits
+    row_handle for every row, at most concurrency rows at a time, so per row
+    lookups wait together instead of one after another. Blocking calls, such
+    as PandoraConnection requests, go through run_blocking.
+
+    stdin and stdout are read and written with asyncio streams when both are
+    pipes or sockets, and from executor threads otherwise. pipelined and
+    worker_processes are not used.
+    """
+
+    def __init__(self):
+        super(AsyncSplStreamingBatchCommand, self).__init__()
+        # rows map_rows handles at once, also the number of run_blocking threads
+        self.concurrency = 16
+        # use asyncio streams on stdin and stdout when they are pipes or sockets
+        self.async_pipes = True
+        self.executor = None
+
+    def process_protocol(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
+        asyncio.run(self.process_protocol_async(argv, input_stream, output_stream))
+
+    async def process_protocol_async(self, argv=None, input_stream=sys.stdin.buffer,
+                                     output_stream=sys.__stdout__.buffer):
+        try:
+            if argv is None:
+                argv = sys.argv
+            logging.debug('execute script command: {}'.format(argv))
+
+            self.metrics = SplMetrics(self.metrics_debug)
+            self.channel = await self.open_channel(input_stream, output_stream)
+            await self.process_protocol_info_async()
+            self.prepare_getinfo()
+            await self.write_packet_async(self.metainfo, [])
+            self.after_getinfo()
+            await self.process_data_async(argv)
+        except Exception as error:
+            logging.exception(error)
+            self.metainfo['error_message'] = "{}".format(error)
+            self.metainfo['error_traceback'] = "{}".format(traceback.format_exc())
+            await self.write_packet_async(self.metainfo, [])
+        finally:
+            if self.channel is not None:
+                self.channel.close()
+                self.channel = None
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+            self.metrics.log_summary()
+
+    async def open_channel(self, input_stream, output_stream):
+        if self.async_pipes and _pipe_fileno(input_stream) is not None and _pipe_fileno(output_stream) is not None:
+            return await AsyncSplChannel.open(input_stream, output_stream)
+        return ThreadedSplChannel(input_stream, output_stream)
+
+    async def process_protocol_info_async(self):
+        with self.metrics.phase(PHASE_READ):
+            self.metainfo, _ = await self.channel.read_packet()
+            if self.metainfo is None:
+                raise RuntimeError('GetInfo Protocol metaLength is invalid: 0')
+        self.metrics.count_in(0, self.channel.packet_length)
+
+    async def read_execute_async(self):
+        """
+        Read one execute packet
+
+        :return: ``(execute_meta, lines)``
+        """
+        with self.metrics.phase(PHASE_READ):
+            execute_meta, body = await self.channel.read_packet()
+            if execute_meta is None:
+                raise RuntimeError('Execute Protocol metaLength is invalid: 0')
+            if execute_meta['action'] != "execute":
+                raise RuntimeError('Execute Protocol action is invalid: {}'.format(execute_meta['action']))
+        with self.metrics.phase(PHASE_PARSE):
+            lines = self.parse_execute_body(execute_meta, body)
+            if not hasattr(lines, '__len__'):
+                lines = list(lines)
+        self.metrics.count_in(len(lines), self.channel.packet_length)
+        return execute_meta, lines
+
+    async def process_data_async(self, argv=None):
+        while True:
+            execute_meta, self.lines = await self.read_execute_async()
+            self.is_finish = execute_meta['finished']
+            resp = await self.handle_lines_async(self.lines)
+            await self.write_packet_async(execute_meta, resp)
+            self.lines = []
+            if self.is_finish:
+                break
+
+    async def handle_lines_async(self, lines):
+        """
+        Run streaming_handle on a chunk, awaiting it when it is a coroutine
+        """
+        with self.metrics.phase(PHASE_HANDLE):
+            resp = self.streaming_handle(lines)
+            if inspect.isawaitable(resp):
+                resp = await resp
+            if self.delta_output:
+                resp = self.delta_lines(lines, resp)
+        return resp
+
+    async def write_packet_async(self, meta_info=None, lines=None):
+        parts = self.encode_packet(meta_info, lines)
+        with self.metrics.phase(PHASE_WRITE):
+            await self.channel.write(*parts)
+
+    async def streaming_handle(self, lines):
+        return await self.map_rows(self.row_handle, lines)
+
+    async def row_handle(self, line):
+        """
+        Handle one row, return the row to send or None to drop it
+        """
+        return line
+
+    async def map_rows(self, func, lines, concurrency=None):
+        """
+        Await func on every line, at most concurrency at a time
+
+        :return: the results in the order of lines, without the None ones unless
+            delta_output is set, delta_lines then takes every result to belong
+            to the line at its position and skips the None ones
+        """
+        if concurrency is None:
+            concurrency = self.concurrency
+        results = [None] * len(lines)
+        rows = iter(enumerate(lines))
+
+        async def work():
+            # the workers share one iterator, each row is taken once
+            for i, line in rows:
+                results[i] = await func(line)
+
+        await asyncio.gather(*[work() for _ in range(max(1, min(concurrency, len(lines))))])
+        if self.delta_output:
+            return results
+        return [result for result in results if result is not None]
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """
+        Run a blocking call on the command's thread pool and await its result
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='spl-async')
+        return await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                functools.partial(func, *args, **kwargs))
@@ -17,6 +17,8 @@ import sys
 import traceback
 
 from .spl_packet_utils import *
+from .spl_channel import SplChannel
+from .spl_metrics import *
 from ..on_demand_action import OnDemandAction
 
 
@@ -30,6 +32,22 @@ class SplBaseCommand(OnDemandAction):
         self.export_fields = []
         self.lines = []
         self.spl_args = []
+        self.channel = None
+        # parse records into SplRow objects sharing one schema per chunk instead of dicts
+        self.compact_rows = False
+        # decode only the fields in require_fields, off by default: every field is then decoded with its type
+        self.project_require_fields = False
+        # with project_require_fields, the other fields are kept undecoded as SplRawValue
+        # when True, dropped when False
+        self.keep_unrequested_fields = True
+        # exchange bodies as binary typed columns when the engine supports it
+        self.binary_body = False
+        self.binary_negotiated = False
+        # keep and log per chunk phase timings in addition to the totals
+        self.metrics_debug = False
+        # add the metrics summary to the meta of the finishing packet
+        self.metrics_in_meta = False
+        self.metrics = SplMetrics()
 
     def on_request(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
         self.process_protocol(argv, input_stream, output_stream)
@@ -40,18 +58,31 @@ class SplBaseCommand(OnDemandAction):
                 argv = sys.argv
             logging.debug('execute script command: {}'.format(argv))
 
+            self.metrics = SplMetrics(self.metrics_debug)
+            self.get_channel(input_stream, output_stream)
             self.process_protocol_info(input_stream)
-            self.init_env_by_getinfo()
-            self.metainfo['require_fields'] = self.config_require_fields()
-            self.metainfo['export_fields'] = self.config_export_fields()
-            send_packet(output_stream, self.metainfo, [])
+            self.prepare_getinfo()
+            self.write_packet(output_stream, self.metainfo, [])
             self.after_getinfo()
             self.process_data(argv, input_stream, output_stream)
         except Exception as error:
             logging.exception(error)
             self.metainfo['error_message'] = "{}".format(error)
             self.metainfo['error_traceback'] = "{}".format(traceback.format_exc())
-            send_packet(output_stream, self.metainfo, [])
+            self.write_packet(output_stream, self.metainfo, [])
+        finally:
+            self.metrics.log_summary()
+
+    def prepare_getinfo(self):
+        """
+        Turn the getinfo meta into the getinfo response
+        """
+        self.init_env_by_getinfo()
+        self.require_fields = self.config_require_fields()
+        self.metainfo['require_fields'] = self.require_fields
+        self.export_fields = self.config_export_fields()
+        self.metainfo['export_fields'] = self.export_fields
+        self.negotiate_getinfo()
 
     def process_data(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
         """
@@ -59,32 +90,149 @@ class SplBaseCommand(OnDemandAction):
         """
         return
 
+    def get_channel(self, input_stream=sys.stdin.buffer, output_stream=None):
+        """
+        Return the channel reading input_stream, opening a new one if needed
+        """
+        channel = self.channel
+        if channel is None or channel.input_stream is not input_stream or \
+                (output_stream is not None and channel.output_stream is not output_stream):
+            if output_stream is None:
+                output_stream = channel.output_stream if channel is not None else sys.__stdout__.buffer
+            self.channel = SplChannel(input_stream, output_stream)
+        return self.channel
+
+    def write_packet(self, output_stream=sys.__stdout__.buffer, meta_info=None, lines=None):
+        """
+        Send a packet, through the channel when it owns output_stream
+        """
+        channel = self.channel
+        if channel is None or channel.output_stream is not output_stream:
+            send_packet(output_stream, meta_info, lines)
+            return
+        parts = self.encode_packet(meta_info, lines)
+        with self.metrics.phase(PHASE_WRITE):
+            channel.write(*parts)
+
+    def encode_packet(self, meta_info=None, lines=None):
+        """
+        Encode an outgoing packet and count its rows and bytes
+
+        :return: ``(head, meta, body)`` bytes
+        """
+        meta_info = self.packet_meta(meta_info)
+        with self.metrics.phase(PHASE_ENCODE):
+            head, meta, body = SplChannel.encode_packet(meta_info, lines)
+        self.metrics.count_out(SplChannel.body_rows(meta_info, body), len(meta) + len(body))
+        return head, meta, body
+
+    def packet_meta(self, meta_info=None):
+        """
+        Add the metrics and the negotiated body format to the meta of an outgoing packet
+        """
+        if self.metrics_in_meta and meta_info is not None and meta_info.get('finished'):
+            meta_info = dict(meta_info)
+            meta_info[META_METRICS] = self.metrics.summary()
+        if self.binary_negotiated:
+            meta_info = dict(meta_info) if meta_info is not None else {}
+            meta_info[META_BODY_FORMAT] = BODY_FORMAT_BINARY_COLUMNS
+        return meta_info
+
     def process_protocol_info(self, input_stream):
-        meta_length, body_length = parse_head(input_stream)
-        if meta_length <= 0:
-            raise RuntimeError('GetInfo Protocol metaLength is invalid: {}'.format(meta_length))
+        channel = self.get_channel(input_stream)
+        with self.metrics.phase(PHASE_READ):
+            meta_length, body_length = channel.read_head()
+            if meta_length <= 0:
+                raise RuntimeError('GetInfo Protocol metaLength is invalid: {}'.format(meta_length))
 
-        self.metainfo = parse_meta(input_stream, meta_length)
+            self.metainfo = channel.read_meta(meta_length)
 
-        # discard body in getinfo
-        parse_body(input_stream, body_length)
+            # discard body in getinfo
+            channel.read_body(body_length)
+        self.metrics.count_in(0, meta_length + body_length)
 
-    def process_protocol_execute(self, input_stream):
-        meta_length, body_length = parse_head(input_stream)
-        if meta_length <= 0:
-            raise RuntimeError('Execute Protocol metaLength is invalid: {}'.format(meta_length))
+    def read_execute(self, input_stream, lines=None):
+        """
+        Read one execute packet
+
+        The records are decoded straight into lines when it is given, without
+        an intermediate list, into a new list otherwise.
 
-        execute_meta = parse_meta(input_stream, meta_length)
+        :return: ``(execute_meta, lines)``
+        """
+        channel = self.get_channel(input_stream)
+        with self.metrics.phase(PHASE_READ):
+            meta_length, body_length = channel.read_head()
+            if meta_length <= 0:
+                raise RuntimeError('Execute Protocol metaLength is invalid: {}'.format(meta_length))
+
+            execute_meta = channel.read_meta(meta_length)
+
+            if execute_meta['action'] != "execute":
+                raise RuntimeError('Execute Protocol action is invalid: {}'.format(execute_meta['action']))
+
+            body = channel.read_body(body_length)
+        with self.metrics.phase(PHASE_PARSE):
+            records = self.parse_execute_body(execute_meta, body)
+            if lines is None:
+                # records parsed lazily from the channel buffer must be read before the next packet reuses it
+                lines = records if hasattr(records, '__len__') else list(records)
+                rows = len(lines)
+            else:
+                rows = len(lines)
+                lines.extend(records)
+                rows = len(lines) - rows
+        self.metrics.count_in(rows, meta_length + body_length)
+        return execute_meta, lines
+
+    def parse_execute_body(self, execute_meta, body):
+        """
+        Decode the body of an execute packet, a memoryview of the channel buffer
+
+        Text records are returned as an iterator parsing the channel buffer, it
+        must be consumed before the next packet is read.
+        """
+        if execute_meta.get(META_BODY_FORMAT) == BODY_FORMAT_BINARY_COLUMNS:
+            from .spl_binary_columns import decode_binary_columns
+            return decode_binary_columns(bytes(body), self.projection(),
+                                         self.keep_unrequested_fields).to_records(self.compact_rows)
+        return self.channel.iter_body(compact=self.compact_rows, projection=self.projection(),
+                                      keep_unrequested=self.keep_unrequested_fields)
 
-        if execute_meta['action'] != "execute":
-            raise RuntimeError('Execute Protocol action is invalid: {}'.format(execute_meta['action']))
+    def projection(self):
+        """
+        Fields the body decoder converts, None for all of them
+        """
+        if not self.project_require_fields or self.require_fields is None or '*' in self.require_fields:
+            return None
+        return set(self.require_fields)
 
+    def process_protocol_execute(self, input_stream):
+        execute_meta, _ = self.read_execute(input_stream, self.lines)
         self.is_finish = execute_meta['finished']
-        tmp = parse_body(input_stream, body_length)
-        if len(tmp) > 0:
-            self.lines.extend(tmp)
         return execute_meta
 
+    def peer_capabilities(self):
+        """
+        Optional protocol features the engine advertised in getinfo
+        """
+        if self.metainfo is None:
+            return set()
+        return set(self.metainfo.get(META_CAPABILITIES, []))
+
+    def negotiate_getinfo(self):
+        """
+        Settle optional protocol features, called before the getinfo response is sent
+        """
+        if self.binary_body and CAPABILITY_BINARY_COLUMNS in self.peer_capabilities():
+            # every packet from here on, the getinfo response included, names its body format
+            self.binary_negotiated = True
+        # the engine escapes backslashes only when it says so, text bodies are coded the same way both ways
+        backslash_escapes = CAPABILITY_BACKSLASH_ESCAPES in self.peer_capabilities()
+        set_backslash_escapes(backslash_escapes)
+        if backslash_escapes:
+            self.metainfo[META_STRING_ESCAPES] = CAPABILITY_BACKSLASH_ESCAPES
+
     def after_getinfo(self):
         return
 
@@ -106,4 +254,7 @@ class SplBaseCommand(OnDemandAction):
         return export_fields
 
     def streaming_handle(self, lines):
+        """
+        Handle records, return a list of records, a pandas DataFrame or a dict of columns
+        """
         return lines, True
@@ -0,0 +1,287 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Binary columnar body format
+
+A body is a header followed by one block per column, all little-endian:
+
+    header   "SPLB", u16 version, u32 rows, u32 columns
+    column   u16 name length, utf-8 name, u8 type, u8 flags
+             [u8 * rows null mask, when flags has FLAG_NULL_MASK]
+             values, starting at an offset of the body aligned to their item size
+               TYPE_INT      i64 * rows
+               TYPE_FLOAT    f64 * rows
+               TYPE_BOOLEAN  u8 * rows
+               TYPE_STRING   u32 * (rows + 1) offsets, then the utf-8 bytes
+               TYPE_ARRAY    same as TYPE_STRING
+               TYPE_NULL     nothing
+
+Strings are not escaped. Numeric columns are wrapped with numpy.frombuffer
+without copying.
+"""
+
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+from .spl_packet_utils import TYPE_STRING, TYPE_INT, TYPE_FLOAT, TYPE_NULL, TYPE_BOOLEAN, TYPE_ARRAY, \
+    SplRawValue, decode_string, is_dataframe
+from .spl_columnar_utils import SplColumns
+
+BINARY_COLUMNS_MAGIC = b'SPLB'
+BINARY_COLUMNS_VERSION = 1
+FLAG_NULL_MASK = 1
+
+_HEADER = struct.Struct('<4sHII')
+_NAME_LENGTH = struct.Struct('<H')
+_COLUMN_INFO = struct.Struct('<BB')
+
+_DTYPES = {
+    TYPE_INT: np.dtype('<i8'),
+    TYPE_FLOAT: np.dtype('<f8'),
+    TYPE_BOOLEAN: np.dtype('u1'),
+}
+_OFFSET_DTYPE = np.dtype('<u4')
+
+
+def _padding(offset, alignment):
+    return -offset % alignment
+
+
+def _type_kind(cls):
+    if cls is type(None):
+        return TYPE_NULL
+    if issubclass(cls, (bool, np.bool_)):
+        return TYPE_BOOLEAN
+    if issubclass(cls, (int, np.integer)):
+        return TYPE_INT
+    if issubclass(cls, (float, np.floating)):
+        return TYPE_FLOAT
+    return TYPE_STRING
+
+
+def _text(value):
+    if type(value) is SplRawValue:
+        # kept in its escaped text form, binary strings are not escaped
+        return decode_string(value)
+    return value if type(value) is str else str(value)
+
+
+def _typed_column(values):
+    """
+    Pick the type of a column and convert it
+
+    None and '' are nulls, the text format writes them alike. Kinds are
+    worked out per distinct value type, not per value.
+
+    :return: ``(type, values, null_mask)``, values a numpy array or a list of str
+    """
+    dtype = getattr(values, 'dtype', None)
+    if dtype is not None and not isinstance(dtype, np.dtype) and hasattr(values, 'isna'):
+        # pandas extension dtypes (Int64, Float64, boolean) hold their nulls as
+        # pd.NA, which numpy would cast to arbitrary values
+        nulls = np.asarray(values.isna(), dtype=np.bool_)
+        if nulls.any():
+            values = [None if null else value for value, null in zip(values.tolist(), nulls.tolist())]
+            dtype = None
+    if dtype is not None and dtype.kind in 'iufb':
+        array = np.asarray(values)
+        if dtype.kind == 'b':
+            return TYPE_BOOLEAN, array.astype(np.bool_, copy=False), None
+        if dtype.kind == 'f':
+            return TYPE_FLOAT, array.astype(np.float64, copy=False), None
+        if dtype.kind == 'i' or array.max(initial=0) <= np.iinfo(np.int64).max:
+            return TYPE_INT, array.astype(np.int64, copy=False), None
+
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    classes = set(map(type, values))
+    if classes == {str}:
+        return TYPE_STRING, values, None
+    kinds = set(map(_type_kind, classes))
+    if TYPE_STRING in kinds and len(kinds - {TYPE_STRING, TYPE_NULL}) > 0 and \
+            not any(isinstance(value, str) and len(value) > 0 for value in values):
+        # the only strings are empty ones, which are nulls
+        kinds.discard(TYPE_STRING)
+    kinds.discard(TYPE_NULL)
+    if len(kinds) == 0:
+        return TYPE_NULL, None, None
+    if TYPE_STRING not in kinds:
+        null_mask = [value is None or isinstance(value, str) for value in values]
+        mask = np.array(null_mask, dtype=np.bool_) if any(null_mask) else None
+        if kinds == {TYPE_BOOLEAN}:
+            return TYPE_BOOLEAN, np.array([not null and bool(value) for value, null in zip(values, null_mask)],
+                                          dtype=np.bool_), mask
+        if TYPE_BOOLEAN not in kinds:
+            column_type = TYPE_INT if kinds == {TYPE_INT} else TYPE_FLOAT
+            fill = 0 if column_type == TYPE_INT else np.nan
+            if mask is not None:
+                values = [fill if null else value for value, null in zip(values, null_mask)]
+            try:
+                return column_type, np.array(values, dtype=_DTYPES[column_type]), mask
+            except OverflowError:
+                pass
+    return TYPE_STRING, ['' if value is None else _text(value) for value in values], None
+
+
+def _records_to_columns(lines):
+    """
+    Turn records into an ordered dict of columns, None where a record lacks a field
+    """
+    rows = [line for line in lines if isinstance(line, Mapping)]
+    fields = {}
+    for row in rows:
+        for field in row:
+            if field not in fields:
+                fields[field] = None
+    return {field: [row.get(field) for row in rows] for field in fields}, len(rows)
+
+
+def encode_binary_columns(lines=None):
+    """
+    Encode records, a pandas DataFrame or a dict of columns as a binary columnar body
+    """
+    if lines is None:
+        return b''
+    if isinstance(lines, dict) or is_dataframe(lines):
+        columns = lines
+        num_rows = len(lines) if is_dataframe(lines) else None
+    else:
+        columns, num_rows = _records_to_columns(lines)
+    if len(columns) == 0:
+        return b''
+
+    typed = []
+    for field, values in columns.items():
+        column_type, values, null_mask = _typed_column(values)
+        length = len(values) if values is not None else num_rows
+        if num_rows is None:
+            num_rows = length
+        elif length is not None and length != num_rows:
+            raise RuntimeError('Column {} has {} rows, expected {}'.format(field, length, num_rows))
+        typed.append((str(field), column_type, values, null_mask))
+    if not num_rows:
+        return b''
+
+    parts = [_HEADER.pack(BINARY_COLUMNS_MAGIC, BINARY_COLUMNS_VERSION, num_rows, len(typed))]
+    offset = _HEADER.size
+
+    def append(data):
+        nonlocal offset
+        parts.append(data)
+        offset += len(data)
+
+    for field, column_type, values, null_mask in typed:
+        name = field.encode('utf-8')
+        append(_NAME_LENGTH.pack(len(name)) + name)
+        append(_COLUMN_INFO.pack(column_type, FLAG_NULL_MASK if null_mask is not None else 0))
+        if null_mask is not None:
+            append(null_mask.astype(np.uint8).tobytes())
+        if column_type == TYPE_NULL:
+            continue
+        if column_type in _DTYPES:
+            dtype = _DTYPES[column_type]
+            append(b'\0' * _padding(offset, dtype.itemsize))
+            append(np.asarray(values).astype(dtype, copy=False).tobytes())
+            continue
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(num_rows + 1, dtype=_OFFSET_DTYPE)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        append(b'\0' * _padding(offset, _OFFSET_DTYPE.itemsize))
+        append(offsets.tobytes())
+        append(b''.join(encoded))
+    return b''.join(parts)
+
+
+def _decode_strings(data, offsets):
+    offsets = offsets.tolist()
+    text = str(data, 'utf-8')
+    if len(text) == len(data):
+        # ascii, byte offsets are character offsets
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+    return [str(data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(len(offsets) - 1)]
+
+
+def binary_columns_rows(data=b''):
+    """
+    Number of rows of a binary columnar body, read from its header
+    """
+    if len(data) < _HEADER.size:
+        return 0
+    return _HEADER.unpack_from(data, 0)[2]
+
+
+def decode_binary_columns(data=b'', projection=None, keep_unrequested=True):
+    """
+    Decode a binary columnar body into SplColumns
+
+    Numeric columns are read only views of data, which must stay unchanged
+    while they are used. Columns outside projection are dropped when
+    keep_unrequested is False, otherwise every column is decoded: unlike the
+    text body, which keeps them as SplRawValue, a binary column costs no
+    parsing, so unrequested fields arrive typed.
+    """
+    if len(data) == 0:
+        return SplColumns()
+    try:
+        view = memoryview(data)
+        magic, version, num_rows, num_columns = _HEADER.unpack_from(view, 0)
+        if magic != BINARY_COLUMNS_MAGIC or version != BINARY_COLUMNS_VERSION:
+            raise RuntimeError('unsupported binary columns header {!r} version {}'.format(magic, version))
+        offset = _HEADER.size
+        select_all = projection is None or '*' in projection or keep_unrequested
+
+        fields = []
+        columns = {}
+        null_masks = {}
+        types = {}
+        for _ in range(num_columns):
+            name_length, = _NAME_LENGTH.unpack_from(view, offset)
+            offset += _NAME_LENGTH.size
+            field = str(view[offset:offset + name_length], 'utf-8')
+            offset += name_length
+            column_type, flags = _COLUMN_INFO.unpack_from(view, offset)
+            offset += _COLUMN_INFO.size
+
+            null_mask = None
+            if flags & FLAG_NULL_MASK:
+                null_mask = np.frombuffer(view, dtype=np.bool_, count=num_rows, offset=offset)
+                offset += num_rows
+
+            if column_type == TYPE_NULL:
+                values = np.full(num_rows, '', dtype=object)
+                null_mask = np.ones(num_rows, dtype=np.bool_)
+            elif column_type in _DTYPES:
+                dtype = _DTYPES[column_type]
+                offset += _padding(offset, dtype.itemsize)
+                values = np.frombuffer(view, dtype=dtype, count=num_rows, offset=offset)
+                offset += num_rows * dtype.itemsize
+                if column_type == TYPE_BOOLEAN:
+                    values = values.view(np.bool_)
+            elif column_type in (TYPE_STRING, TYPE_ARRAY):
+                offset += _padding(offset, _OFFSET_DTYPE.itemsize)
+                offsets = np.frombuffer(view, dtype=_OFFSET_DTYPE, count=num_rows + 1, offset=offset)
+                offset += (num_rows + 1) * _OFFSET_DTYPE.itemsize
+                size = int(offsets[-1])
+                values = np.array(_decode_strings(view[offset:offset + size], offsets), dtype=object)
+                offset += size
+            else:
+                raise RuntimeError('unknown column type {} for {}'.format(column_type, field))
+
+            if select_all or field in projection:
+                fields.append(field)
+                columns[field] = values
+                null_masks[field] = null_mask if null_mask is not None else np.zeros(num_rows, dtype=np.bool_)
+                types[field] = column_type
+        return SplColumns(fields, columns, null_masks, types, num_rows)
+    except Exception as error:
+        raise RuntimeError('Failed to parser spl protocol body: {}'.format(error))
@@ -0,0 +1,225 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import io
+import json
+import os
+import sys
+
+from .spl_packet_utils import BODY_READ_SIZE, META_BODY_FORMAT, BODY_FORMAT_BINARY_COLUMNS, convert_body_to_str, \
+    iter_body_buffer
+
+
+class SplChannel(object):
+    """
+    Buffered endpoint of the spl chunked protocol
+
+    Input is read with readinto into one reusable bytearray, meta and body are
+    handed out as memoryview slices of it, and every outgoing packet is written
+    with a single gathered write. A slice stays valid until the next read.
+    """
+
+    def __init__(self, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer,
+                 buffer_size=BODY_READ_SIZE):
+        self.input_stream = input_stream
+        self.output_stream = output_stream
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.body_start = 0
+        self.body_end = 0
+        self.output_fileno = self._fileno(output_stream)
+
+    @staticmethod
+    def _fileno(stream):
+        if not hasattr(os, 'writev'):
+            return None
+        try:
+            return stream.fileno()
+        except (AttributeError, io.UnsupportedOperation, ValueError):
+            return None
+
+    def _reserve(self, size):
+        """
+        Make room for size bytes from self.start, compacting or growing the buffer
+        """
+        if self.start + size <= len(self.buffer):
+            return
+        pending = self.end - self.start
+        if size <= len(self.buffer):
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+        else:
+            buffer = bytearray(max(size, 2 * len(self.buffer)))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        self.start = 0
+        self.end = pending
+
+    def _fill(self, size):
+        """
+        Read until size bytes are available from self.start, never past them
+        """
+        self._reserve(size)
+        while self.end - self.start < size:
+            count = self.input_stream.readinto(self.view[self.end:self.start + size])
+            if not count:
+                raise RuntimeError('Unexpected end of stream, {} bytes missing'.format(
+                    size - (self.end - self.start)))
+            self.end += count
+
+    def _fill_some(self):
+        """
+        Read whatever input is available without waiting for more
+        """
+        if self.end == len(self.buffer):
+            self._reserve(self.end - self.start + BODY_READ_SIZE)
+        if hasattr(self.input_stream, 'readinto1'):
+            count = self.input_stream.readinto1(self.view[self.end:])
+        else:
+            line = self.input_stream.readline()
+            self._reserve(self.end - self.start + len(line))
+            count = len(line)
+            self.buffer[self.end:self.end + count] = line
+        if not count:
+            raise RuntimeError('Unexpected end of stream while reading spl protocol header')
+        self.end += count
+
+    def _take(self, size):
+        """
+        Consume size bytes and return them as a memoryview slice
+        """
+        self._fill(size)
+        data = self.view[self.start:self.start + size]
+        self.start += size
+        return data
+
+    def read_head(self):
+        """
+        Read the chunked protocol header
+
+        format: chunked 1.0,<meta_length>,<body_length>\n
+        """
+        while True:
+            newline = self.buffer.find(b'\n', self.start, self.end)
+            if newline >= 0:
+                break
+            self._fill_some()
+        try:
+            header = str(self.view[self.start:newline], "utf-8")
+            self.start = newline + 1
+            parts = str.split(header, ",")
+            return int(parts[1]), int(parts[2])
+        except Exception as error:
+            raise RuntimeError('Failed to read spl protocol header: {}'.format(error))
+
+    def read_meta(self, length=0):
+        """
+        Read and decode the json meta of length bytes
+        """
+        try:
+            return json.loads(str(self._take(length), "utf-8"))
+        except Exception as error:
+            raise RuntimeError('Failed to parser spl protocol meta: {}'.format(error))
+
+    def read_body(self, length=0):
+        """
+        Read the body of length bytes and return it as a memoryview slice
+        """
+        if length <= 0:
+            self.body_start = self.body_end = self.start
+            return self.view[self.start:self.start]
+        body = self._take(length)
+        self.body_start = self.start - length
+        self.body_end = self.start
+        return body
+
+    @property
+    def body_length(self):
+        """
+        Length of the body returned by the last read_body
+        """
+        return self.body_end - self.body_start
+
+    def iter_body(self, batch_size=None, compact=False, projection=None, keep_unrequested=True):
+        """
+        Parse the body returned by the last read_body into records incrementally
+        """
+        return iter_body_buffer(self.buffer, self.body_start, self.body_end, batch_size, compact,
+                                projection, keep_unrequested)
+
+    def read_packet(self):
+        """
+        Read one packet
+
+        :return: ``(meta, body)``, body being a memoryview slice
+        """
+        meta_length, body_length = self.read_head()
+        meta = self.read_meta(meta_length) if meta_length > 0 else None
+        return meta, self.read_body(body_length)
+
+    def write(self, *parts):
+        """
+        Write all parts with one gathered write
+        """
+        if self.output_fileno is None:
+            self.output_stream.write(b''.join(parts))
+            self.output_stream.flush()
+            return
+
+        # anything the stream buffered must go out before writing to its fd
+        self.output_stream.flush()
+        parts = [part for part in parts if len(part) > 0]
+        while len(parts) > 0:
+            written = os.writev(self.output_fileno, parts)
+            while len(parts) > 0 and written >= len(parts[0]):
+                written -= len(parts[0])
+                parts.pop(0)
+            if written > 0:
+                parts[0] = memoryview(parts[0])[written:]
+
+    @staticmethod
+    def encode_packet(meta_info=None, lines=None):
+        """
+        Encode one packet, as binary columns when meta_info names that body format
+
+        :return: ``(head, meta, body)`` bytes
+        """
+        if meta_info is None:
+            meta_info = {}
+        meta = json.dumps(meta_info).encode("utf-8")
+        if meta_info.get(META_BODY_FORMAT) == BODY_FORMAT_BINARY_COLUMNS:
+            from .spl_binary_columns import encode_binary_columns
+            body = encode_binary_columns(lines)
+        else:
+            body = convert_body_to_str(lines).encode("utf-8")
+        head = ('chunked 1.0,%s,%s\n' % (len(meta), len(body))).encode("utf-8")
+        return head, meta, body
+
+    @staticmethod
+    def body_rows(meta_info, body):
+        """
+        Number of rows of an encoded body, the text header line not counted
+        """
+        if meta_info is not None and meta_info.get(META_BODY_FORMAT) == BODY_FORMAT_BINARY_COLUMNS:
+            from .spl_binary_columns import binary_columns_rows
+            return binary_columns_rows(body)
+        # rows are joined by newlines after the header, escaped values hold none
+        return body.count(b'\n')
+
+    def write_packet(self, meta_info=None, lines=None):
+        """
+        Encode and send one packet
+        """
+        self.write(*self.encode_packet(meta_info, lines))
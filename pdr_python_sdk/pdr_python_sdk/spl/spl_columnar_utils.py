@@ -0,0 +1,315 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import sys
+
+import numpy as np
+
+from .spl_packet_utils import TYPE_STRING, TYPE_INT, TYPE_FLOAT, TYPE_NULL, TYPE_BOOLEAN, TYPE_ARRAY, \
+    SplRawValue, decode_strings, encode_strings, encode_value
+from .spl_row import SplRow, SplRowSchema
+
+_TAG_STRING = str(TYPE_STRING)
+_TAG_INT = str(TYPE_INT)
+_TAG_FLOAT = str(TYPE_FLOAT)
+_TAG_NULL = str(TYPE_NULL)
+_TAG_BOOLEAN = str(TYPE_BOOLEAN)
+_TAG_ARRAY = str(TYPE_ARRAY)
+
+
+class SplColumns(object):
+    """
+    Columnar form of a chunk body
+
+    columns maps every field to a numpy array, null_masks maps every field to a
+    boolean array which is True where the cell was TYPE_NULL (or missing), and
+    types maps every field to the type shared by its non null cells, None when
+    the cells carry mixed types.
+    """
+
+    def __init__(self, fields=None, columns=None, null_masks=None, types=None, num_rows=0):
+        self.fields = fields if fields is not None else []
+        self.columns = columns if columns is not None else {}
+        self.null_masks = null_masks if null_masks is not None else {}
+        self.types = types if types is not None else {}
+        self.num_rows = num_rows
+
+    def __len__(self):
+        return self.num_rows
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def to_records(self, compact=False):
+        """
+        Convert columns back into records, SplRow objects sharing one schema
+        with compact
+
+        Nulls become '' as in parse_body. Unlike parse_body, records of rows
+        which were shorter than the header hold '' for the missing fields
+        instead of leaving them out.
+        """
+        values = []
+        for field in self.fields:
+            column = self.columns[field].tolist()
+            for i in np.flatnonzero(self.null_masks[field]).tolist():
+                column[i] = ''
+            values.append(column)
+        if compact:
+            schema = SplRowSchema(self.fields)
+            return [SplRow(schema, list(row)) for row in zip(*values)]
+        return [dict(zip(self.fields, row)) for row in zip(*values)]
+
+
+def _convert_int(values):
+    try:
+        return np.array(values, dtype=np.int64)
+    except OverflowError:
+        return np.array([int(value) for value in values], dtype=object)
+
+
+def _convert_float(values):
+    return np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+
+
+def _convert_boolean(values):
+    return np.fromiter((str.lower(value) == 'true' for value in values), dtype=np.bool_, count=len(values))
+
+
+def _convert_string(values):
+    return np.array(decode_strings(values), dtype=object)
+
+
+def _convert_array(values):
+    return np.array(values, dtype=object)
+
+
+_CONVERTERS = {
+    _TAG_STRING: _convert_string,
+    _TAG_INT: _convert_int,
+    _TAG_FLOAT: _convert_float,
+    _TAG_BOOLEAN: _convert_boolean,
+    _TAG_ARRAY: _convert_array,
+}
+
+_TYPES = {
+    _TAG_STRING: TYPE_STRING,
+    _TAG_INT: TYPE_INT,
+    _TAG_FLOAT: TYPE_FLOAT,
+    _TAG_NULL: TYPE_NULL,
+    _TAG_BOOLEAN: TYPE_BOOLEAN,
+    _TAG_ARRAY: TYPE_ARRAY,
+}
+
+
+def _column_layout(tags):
+    """
+    Pick the column type and numpy dtype for a set of cell type tags
+    """
+    kinds = tags - {_TAG_NULL}
+    if len(kinds) == 0:
+        return TYPE_NULL, object
+    if len(kinds) == 1:
+        tag = next(iter(kinds))
+        if tag == _TAG_INT:
+            return TYPE_INT, np.int64
+        if tag == _TAG_FLOAT:
+            return TYPE_FLOAT, np.float64
+        if tag == _TAG_BOOLEAN:
+            return TYPE_BOOLEAN, np.bool_
+        return _TYPES.get(tag), object
+    if kinds == {_TAG_INT, _TAG_FLOAT}:
+        return TYPE_FLOAT, np.float64
+    return None, object
+
+
+def _null_value(dtype):
+    if dtype is np.float64:
+        return np.nan
+    if dtype is np.int64:
+        return 0
+    if dtype is np.bool_:
+        return False
+    return ''
+
+
+def _split_uniform_column(cells):
+    """
+    Strip the type tag from a column whose cells all share one tag
+
+    Escaped values never contain a raw tab, so joining the column with tabs and
+    splitting on "\\t<tag>," cuts it back into values in one pass.
+
+    :return: ``(tag, values)``, or ``(None, None)`` when the tags differ
+    """
+    tag = str.partition(cells[0], ',')[0]
+    prefix = tag + ','
+    joined = '\t'.join(cells)
+    if not joined.startswith(prefix) or joined.count('\t' + prefix) != len(cells) - 1:
+        return None, None
+    return tag, str.split(joined[len(prefix):], '\t' + prefix)
+
+
+def decode_column(cells):
+    """
+    Decode the "type,value" cells of one column
+
+    Cells are grouped by type tag and every group is converted in a single
+    vectorized call, so the type dispatch happens once per group instead of
+    once per cell.
+
+    :return: ``(values, null_mask, type)``
+    """
+    tag, values = _split_uniform_column(cells)
+    if tag is not None:
+        column_type, dtype = _column_layout({tag})
+        if tag == _TAG_NULL:
+            return np.full(len(values), '', dtype=object), np.ones(len(values), dtype=bool), column_type
+        converter = _CONVERTERS.get(tag, _convert_array)
+        column = converter(values)
+        if dtype is not object and column.dtype != dtype:
+            column = column.astype(object)
+        return column, np.zeros(len(values), dtype=bool), column_type
+
+    tags, _, values = zip(*[str.partition(cell, ',') for cell in cells])
+    kinds = set(tags)
+    column_type, dtype = _column_layout(kinds)
+    tag_array = np.array(tags)
+    null_mask = tag_array == _TAG_NULL
+    column = np.full(len(values), _null_value(dtype), dtype=dtype)
+    for tag in kinds:
+        if tag == _TAG_NULL:
+            continue
+        index = np.flatnonzero(tag_array == tag)
+        converter = _CONVERTERS.get(tag, _convert_array)
+        converted = converter([values[i] for i in index.tolist()])
+        if converted.dtype == object and column.dtype != object:
+            # ints beyond int64 come back as python ints
+            column = column.astype(object)
+        column[index] = converted
+    return column, null_mask, column_type
+
+
+def raw_column(cells):
+    """
+    Keep the cells of an unrequested column undecoded, as SplRawValue objects
+    """
+    tag, values = _split_uniform_column(cells)
+    if tag is None:
+        values = [str.partition(cell, ',')[2] for cell in cells]
+    return np.array(list(map(SplRawValue, values)), dtype=object)
+
+
+def decode_body_columns(body='', projection=None, keep_unrequested=True):
+    """
+    Decode a chunk body string into SplColumns
+
+    Only fields in projection are type converted, None or one containing '*'
+    means all. Other fields become raw_column arrays, or are dropped when
+    keep_unrequested is False.
+    """
+    rows = str.split(body, '\n')
+    if len(rows) < 2:
+        return SplColumns()
+
+    fields = str.split(rows[0], '\t')
+    width = len(fields)
+    if projection is None or '*' in projection:
+        selected = list(enumerate(fields))
+    else:
+        selected = [(i, field) for i, field in enumerate(fields) if keep_unrequested or field in projection]
+    rows = rows[1:]
+    num_rows = len(rows)
+    if all(str.count(row, '\t') == width - 1 for row in rows):
+        # rectangular body: every column is a strided slice of the flat cell list
+        cells = str.split('\t'.join(rows), '\t')
+        column_cells = [cells[i::width] for i, _ in selected]
+    else:
+        column_cells = [[] for _ in selected]
+        for row in rows:
+            parts = str.split(row, '\t')
+            for cells, (i, _) in zip(column_cells, selected):
+                cells.append(parts[i] if i < len(parts) else _TAG_NULL + ',')
+
+    columns = {}
+    null_masks = {}
+    types = {}
+    for (_, field), cells in zip(selected, column_cells):
+        if projection is None or '*' in projection or field in projection:
+            columns[field], null_masks[field], types[field] = decode_column(cells)
+        else:
+            columns[field] = raw_column(cells)
+            null_masks[field] = np.zeros(num_rows, dtype=bool)
+            types[field] = None
+
+    return SplColumns([field for _, field in selected], columns, null_masks, types, num_rows)
+
+
+def _encode_column(values):
+    """
+    str() every cell of a column, escaping only columns that can hold text
+    """
+    dtype = getattr(values, 'dtype', None)
+    if hasattr(values, 'tolist'):
+        values = values.tolist()
+    if dtype is not None and dtype.kind in 'iufb':
+        return list(map(str, values))
+    if all(type(value) is str for value in values):
+        # a text column is checked for escapes once instead of cell by cell
+        return encode_strings(values)
+    return list(map(encode_value, values))
+
+
+def convert_columns_to_str(columns):
+    """
+    Encode a pandas DataFrame or a dict of columns to string
+
+    Every column is converted and escaped as a whole, rows are only assembled
+    when joining the final body. The result is the same as encoding the
+    equivalent list of records.
+    """
+    fields = []
+    cells = []
+    num_rows = None
+    for field, values in columns.items():
+        column = _encode_column(values)
+        if num_rows is None:
+            num_rows = len(column)
+        elif len(column) != num_rows:
+            raise RuntimeError('Column {} has {} rows, expected {}'.format(field, len(column), num_rows))
+        fields.append(str(field))
+        cells.append(column)
+
+    if not num_rows:
+        return ''
+
+    out = ['\t'.join(fields)]
+    out.extend(map('\t'.join, zip(*cells)))
+    return '\n'.join(out)
+
+
+def parse_body_columns(input_stream=sys.stdin.buffer, length=0, projection=None, keep_unrequested=True):
+    """
+    Parse body into SplColumns, one numpy array per field
+    """
+    if length <= 0:
+        return SplColumns()
+
+    try:
+        body = input_stream.read(length).decode("utf-8")
+        return decode_body_columns(body, projection, keep_unrequested)
+    except Exception as error:
+        raise RuntimeError('Failed to parser spl protocol body: {}'.format(error))
@@ -0,0 +1,140 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import sys
+
+import pandas as pd
+
+from .spl_packet_utils import *
+from .spl_columnar_utils import decode_body_columns
+from .spl_binary_columns import decode_binary_columns
+from .spl_streaming_batch_command import SplStreamingBatchCommand
+from .spl_streaming_chunk_command import SplStreamingChunkCommand
+
+
+def columns_to_dataframe(columns):
+    """
+    Build a DataFrame from SplColumns, with dtypes following the column types
+
+    Int and boolean columns with nulls become nullable Int64 and boolean
+    columns, nulls of float columns are NaN and of other columns None.
+    """
+    data = {}
+    for field in columns.fields:
+        values = columns.columns[field]
+        null_mask = columns.null_masks[field]
+        column_type = columns.types[field]
+        if not null_mask.any():
+            data[field] = values
+        elif column_type == TYPE_INT and values.dtype.kind == 'i':
+            data[field] = pd.arrays.IntegerArray(values.copy(), null_mask.copy())
+        elif column_type == TYPE_BOOLEAN:
+            data[field] = pd.arrays.BooleanArray(values.copy(), null_mask.copy())
+        elif values.dtype.kind == 'f':
+            data[field] = values
+        else:
+            values = values.astype(object)
+            values[null_mask] = None
+            data[field] = values
+    return pd.DataFrame(data, index=pd.RangeIndex(columns.num_rows))
+
+
+def dataframe_to_columns(df):
+    """
+    Prepare a DataFrame for column-wise encoding
+
+    Missing values of object, float and nullable columns, NaN included, become
+    empty cells, the way the text format writes them.
+    """
+    if not is_dataframe(df):
+        return df
+    columns = {}
+    for field in df.columns:
+        column = df[field]
+        if column.dtype == object or column.dtype.kind == 'f' or pd.api.types.is_extension_array_dtype(column.dtype):
+            missing = column.isna()
+            if missing.any():
+                column = column.astype(object).where(~missing, '')
+        columns[field] = column
+    return columns
+
+
+class SplDataFrameCommand(object):
+    """
+    Mixin decoding every execute body straight into a pandas DataFrame
+
+    Bodies are decoded column by column, text ones with decode_body_columns and
+    binary ones with decode_binary_columns, and dataframe_handle returns a
+    DataFrame which is encoded column-wise. No list of records is built in
+    either direction.
+    """
+
+    def dataframe_handle(self, df):
+        """
+        Handle a DataFrame, return a DataFrame
+        """
+        return df
+
+    def streaming_handle(self, lines):
+        return self.dataframe_handle(lines)
+
+    def parse_execute_body(self, execute_meta, body):
+        """
+        Decode the body of an execute packet into a DataFrame
+        """
+        if execute_meta.get(META_BODY_FORMAT) == BODY_FORMAT_BINARY_COLUMNS:
+            columns = decode_binary_columns(bytes(body), self.projection(), self.keep_unrequested_fields)
+        else:
+            try:
+                columns = decode_body_columns(str(body, 'utf-8'), self.projection(), self.keep_unrequested_fields)
+            except Exception as error:
+                raise RuntimeError('Failed to parser spl protocol body: {}'.format(error))
+        return columns_to_dataframe(columns)
+
+    def write_packet(self, output_stream=sys.__stdout__.buffer, meta_info=None, lines=None):
+        super(SplDataFrameCommand, self).write_packet(output_stream, meta_info, dataframe_to_columns(lines))
+
+
+class SplDataFrameBatchCommand(SplDataFrameCommand, SplStreamingBatchCommand):
+    """
+    Batch command whose dataframe_handle gets one DataFrame per chunk
+
+    pipelined and worker_processes work as for SplStreamingBatchCommand, worker
+    slices are row ranges of the chunk's DataFrame.
+    """
+
+    def process_protocol_execute(self, input_stream):
+        execute_meta, self.lines = self.read_execute(input_stream)
+        self.is_finish = execute_meta['finished']
+        return execute_meta
+
+
+class SplDataFrameChunkCommand(SplDataFrameCommand, SplStreamingChunkCommand):
+    """
+    Chunk command whose dataframe_handle gets all chunks as one DataFrame once
+    the engine finishes
+
+    Chunks are buffered as DataFrames, and spilled to disk whole when
+    memory_budget is set.
+    """
+
+    def process_protocol_execute(self, input_stream):
+        execute_meta, df = self.read_execute(input_stream)
+        self.is_finish = execute_meta['finished']
+        self.lines.append(df)
+        return execute_meta
+
+    def streaming_handle(self, lines):
+        frames = [df for df in lines if len(df.columns) > 0]
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 0 else pd.DataFrame()
+        return self.dataframe_handle(df)
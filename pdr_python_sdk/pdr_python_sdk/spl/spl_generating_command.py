@@ -12,21 +12,99 @@ limitations under the License.
 """
 
 import sys
+from collections.abc import Mapping
 
 from .spl_packet_utils import *
 from .spl_base_command import SplBaseCommand
+from .spl_metrics import PHASE_HANDLE
+
+
+def iter_generated_rows(generated):
+    """
+    Flatten what a generator yields, single records or batches of records
+    """
+    for item in generated:
+        if isinstance(item, Mapping):
+            yield item
+        elif is_dataframe(item):
+            yield from item.to_dict('records')
+        else:
+            yield from item
+
+
+def estimate_row_size(row):
+    """
+    Rough size of a record once encoded
+    """
+    return sum(len(str(value)) + 1 for value in row.values())
 
 
 class SplGeneratingCommand(SplBaseCommand):
+    def __init__(self):
+        super(SplGeneratingCommand, self).__init__()
+        # packet bounds used when generate() returns an iterator or generator
+        self.max_packet_rows = 10000
+        self.max_packet_bytes = 8 * 1024 * 1024
+        self.generated_rows = None
+        self.generator_done = False
+        # the engine asks for another round while a response says finished false
+        self.unfinished_negotiated = False
+
     def generate(self):
+        """
+        Return the list of lines for this execute round, or an iterator or
+        generator of lines (or of lists of lines) which the base class cuts
+        into packets across the following execute rounds
+
+        An engine which did not negotiate CAPABILITY_UNFINISHED_RESPONSE sends
+        no round after the finishing one, and everything the generator still
+        holds then goes into that round's packet. An engine sending a single
+        execute gets the whole generator in one packet.
+        """
         lines = []
         return lines
 
+    def negotiate_getinfo(self):
+        super(SplGeneratingCommand, self).negotiate_getinfo()
+        self.unfinished_negotiated = CAPABILITY_UNFINISHED_RESPONSE in self.peer_capabilities()
+
     def process_data(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
         while True:
             execute_meta = self.process_protocol_execute(input_stream)
-            resp = self.generate()
-            send_packet(output_stream, execute_meta, resp)
+            with self.metrics.phase(PHASE_HANDLE):
+                if self.generated_rows is not None:
+                    resp = self.next_packet_lines()
+                elif self.generator_done:
+                    resp = []
+                else:
+                    resp = self.generate()
+                    if resp is not None and not isinstance(resp, (list, tuple, dict)) and not is_dataframe(resp):
+                        self.generated_rows = iter_generated_rows(resp)
+                        resp = self.next_packet_lines()
+            if self.is_finish and self.generated_rows is not None:
+                # the generator has rows left, ask the engine for another round
+                execute_meta = dict(execute_meta, finished=False)
+                self.is_finish = False
+            self.write_packet(output_stream, execute_meta, resp)
             self.lines = []
             if self.is_finish:
-                break
\ No newline at end of file
+                break
+
+    def next_packet_lines(self):
+        """
+        Take the lines of one packet from the active generator
+
+        Stops at max_packet_rows lines or max_packet_bytes estimated bytes. On
+        the finishing round everything left is taken, since no further round
+        will come, unless the engine negotiated CAPABILITY_UNFINISHED_RESPONSE.
+        """
+        lines = []
+        size = 0
+        for line in self.generated_rows:
+            lines.append(line)
+            size += estimate_row_size(line)
+            if (not self.is_finish or self.unfinished_negotiated) and (len(lines) >= self.max_packet_rows or size >= self.max_packet_bytes):
+                return lines
+        self.generated_rows = None
+        self.generator_done = True
+        return lines
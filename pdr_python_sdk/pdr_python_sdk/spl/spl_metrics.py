@@ -0,0 +1,133 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PHASE_READ = 'read'
+PHASE_PARSE = 'parse'
+PHASE_HANDLE = 'handle'
+PHASE_ENCODE = 'encode'
+PHASE_WRITE = 'write'
+PHASES = (PHASE_READ, PHASE_PARSE, PHASE_HANDLE, PHASE_ENCODE, PHASE_WRITE)
+
+META_METRICS = 'metrics'
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process in KiB, None where unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+class SplMetrics(object):
+    """
+    Time spent per protocol phase, and rows and bytes in and out
+
+    Chunk 0 is the getinfo exchange, which has no parse or handle phase. A
+    phase that runs once per chunk in order is assigned to the next chunk it
+    has not run for, so timings from the reader and writer threads of a
+    pipelined command line up too. Per chunk timings are only kept and logged
+    when debug is True.
+    """
+
+    def __init__(self, debug=False):
+        self.debug = debug
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self.counts[PHASE_PARSE] = self.counts[PHASE_HANDLE] = 1
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.chunks = []
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name, chunk=None):
+        """
+        Time the enclosed block as one run of phase name, for chunk when given
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, chunk)
+
+    def add(self, name, seconds, chunk=None):
+        with self.lock:
+            index = self.counts[name] if chunk is None else chunk
+            self.counts[name] = index + 1
+            self.seconds[name] += seconds
+            if not self.debug:
+                return
+            while len(self.chunks) <= index:
+                self.chunks.append({})
+            self.chunks[index][name] = seconds
+        logging.debug('spl chunk {} {} took {:.6f}s'.format(index, name, seconds))
+
+    def last_chunk(self):
+        """
+        Index of the last chunk read
+        """
+        return self.counts[PHASE_READ] - 1
+
+    def count_in(self, rows=0, size=0):
+        with self.lock:
+            self.rows_in += rows
+            self.bytes_in += size
+
+    def count_out(self, rows=0, size=0):
+        with self.lock:
+            self.rows_out += rows
+            self.bytes_out += size
+
+    def summary(self):
+        """
+        Totals so far as a json serializable dict
+        """
+        with self.lock:
+            summary = {
+                'chunks': max(self.counts[PHASE_READ] - 1, 0),
+                'rows_in': self.rows_in,
+                'rows_out': self.rows_out,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'seconds': {name: round(seconds, 6) for name, seconds in self.seconds.items()},
+                'elapsed': round(time.perf_counter() - self.started, 6),
+                'peak_rss_kb': peak_rss_kb(),
+            }
+            if self.debug:
+                summary['per_chunk'] = [{name: round(seconds, 6) for name, seconds in chunk.items()}
+                                        for chunk in self.chunks]
+        return summary
+
+    def log_summary(self):
+        logging.info('spl command metrics: {}'.format(json.dumps(self.summary())))
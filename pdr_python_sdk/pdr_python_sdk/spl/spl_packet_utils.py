@@ -12,7 +12,11 @@ limitations under the License.
 """
 
 import json
+import re
 import sys
+from collections.abc import Mapping
+
+from .spl_row import MISSING, SplRow, SplRowSchema
 
 TYPE_STRING = 0
 TYPE_INT = 1
@@ -21,6 +25,26 @@ TYPE_NULL = 3
 TYPE_BOOLEAN = 4
 TYPE_ARRAY = 5
 
+BODY_READ_SIZE = 64 * 1024
+
+# getinfo meta key listing the optional protocol features a peer supports
+META_CAPABILITIES = 'capabilities'
+# rows carry only changed fields plus ROW_INDEX_FIELD, the engine merges them
+CAPABILITY_DELTA_OUTPUT = 'delta_output'
+ROW_INDEX_FIELD = '_row'
+# packet meta key naming the body encoding, text when absent
+META_BODY_FORMAT = 'body_format'
+# bodies are binary typed columns, see spl_binary_columns
+BODY_FORMAT_BINARY_COLUMNS = 'binary_columns'
+CAPABILITY_BINARY_COLUMNS = BODY_FORMAT_BINARY_COLUMNS
+# text bodies escape backslashes as well as tabs and newlines
+CAPABILITY_BACKSLASH_ESCAPES = 'backslash_escapes'
+# getinfo response key naming the string escapes the command settled on
+META_STRING_ESCAPES = 'string_escapes'
+# a response to the finishing execute may say finished false, the engine then
+# sends another finishing execute
+CAPABILITY_UNFINISHED_RESPONSE = 'unfinished_response'
+
 
 def parse_head(input_stream=sys.stdin.buffer):
     """
@@ -56,69 +80,158 @@ def parse_meta(input_stream=sys.stdin.buffer, length=0):
     return metainfo
 
 
+_UNESCAPE_PATTERN = re.compile(r'\\([\\tn])')
+_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n'}
+
+# backslashes are escaped too, only once the engine negotiated CAPABILITY_BACKSLASH_ESCAPES
+_backslash_escapes = False
+
+
+def set_backslash_escapes(enabled=False):
+    """
+    Choose the string escapes of text bodies
+
+    Off, the protocol default, only tabs and newlines are escaped and any
+    other backslash is sent as is, so values pass through unchanged. On, a
+    backslash is escaped as \\\\ and a literal backslash-n survives a round trip.
+    """
+    global _backslash_escapes
+    _backslash_escapes = enabled
+
+
+def _unescape(match):
+    return _UNESCAPES[match.group(1)]
+
+
 def decode_string(value):
     """
-    Decode special character, \t \n
+    Decode special characters, \\t \\n, and \\\\ with backslash escapes on
+
+    Values without a backslash are returned as is. A backslash before any
+    other character is kept.
     """
-    value = str.replace(value, '\\t', '\t')
-    value = str.replace(value, '\\n', '\n')
-    return value
+    if '\\' not in value:
+        return value
+    if not _backslash_escapes or '\\\\' not in value:
+        # no escaped backslash, so every \\t and \\n is an escape
+        return str.replace(str.replace(value, '\\t', '\t'), '\\n', '\n')
+    return _UNESCAPE_PATTERN.sub(_unescape, value)
 
 
 def encode_string(value):
     """
-    Encode special character, \t \n
+    Encode special characters, \\t \\n, and \\ with backslash escapes on
+
+    Values without one of them are returned as is.
     """
-    value = str.replace(value, '\t', '\\t')
-    value = str.replace(value, '\n', '\\n')
-    return value
+    if _backslash_escapes and '\\' in value:
+        value = str.replace(value, '\\', '\\\\')
+    elif '\t' not in value and '\n' not in value:
+        return value
+    return str.replace(str.replace(value, '\t', '\\t'), '\n', '\\n')
+
+
+def decode_strings(values):
+    """
+    decode_string a column of values, skipping the column when no value holds a backslash
+    """
+    if '\\' not in '\t'.join(values):
+        return list(values)
+    return [decode_string(value) if '\\' in value else value for value in values]
+
+
+def encode_strings(values):
+    """
+    encode_string a column of values, skipping the column when no value needs escaping
+    """
+    joined = '\0'.join(values)
+    if ('\\' not in joined or not _backslash_escapes) and '\t' not in joined and '\n' not in joined:
+        return list(values)
+    return [encode_string(value) for value in values]
+
+
+class SplRawValue(str):
+    """
+    Value of a field the command did not request, kept in its escaped wire
+    form and sent back unchanged
+    """
+    __slots__ = ()
+
+
+def encode_value(value):
+    """
+    Encode one record value for the body
+    """
+    cls = type(value)
+    if cls is str:
+        return encode_string(value)
+    if cls is SplRawValue:
+        return value
+    if cls is int or cls is float or cls is bool:
+        # str() of these never holds a tab or newline
+        return str(value)
+    return encode_string(str(value))
+
+
+def is_dataframe(lines):
+    """
+    Check whether lines is a pandas DataFrame without importing pandas
+    """
+    pandas = sys.modules.get('pandas')
+    return pandas is not None and isinstance(lines, pandas.DataFrame)
 
 
 def convert_body_to_str(lines=[]):
     """
     Encode lines data to string
+
+    lines is a list or any other iterable of records, a pandas DataFrame or a
+    dict of columns. For records the header lists fields in order of first appearance, and a
+    row carries values for every field known when it is reached, empty for the
+    ones it lacks, plus the fields it introduces itself.
     """
     if lines is None:
         return ''
 
-    if len(lines) == 0:
+    if isinstance(lines, dict) or is_dataframe(lines):
+        from .spl_columnar_utils import convert_columns_to_str
+        return convert_columns_to_str(lines)
+
+    rows = [line for line in lines if isinstance(line, Mapping)]
+    if len(rows) == 0:
         return ''
 
-    field_str = ""
-    line_strs = []
-    fields = []
-    allfields = {}
-    for line in lines:
-        if not isinstance(line, dict):
-            continue
-        row = dict(line)
-        line_str = ''
-        if len(fields) != 0:
-            for field in fields:
-                if field not in row:
-                    line_str += '\t'
-                else:
-                    line_str = line_str + encode_string(str(row[field])) + '\t'
+    encode = encode_value
+    if isinstance(rows[0], SplRow):
+        schema = rows[0].schema
+        if all(isinstance(row, SplRow) and row.is_plain(schema) for row in rows):
+            # compact rows of one chunk, values are already in header order
+            out = ['\t'.join(schema.fields)]
+            out.extend(['\t'.join([encode(value) for value in row.row_values]) for row in rows])
+            return '\n'.join(out)
+
+    fields = list(rows[0])
+    first_keys = rows[0].keys()
+    if all(row.keys() == first_keys for row in rows):
+        # every row shares one schema, no per-row field bookkeeping needed
+        out = ['\t'.join(fields)]
+        out.extend(['\t'.join([encode(row[field]) for field in fields]) for row in rows])
+        return '\n'.join(out)
 
+    fields = []
+    allfields = set()
+    line_strs = []
+    for row in rows:
+        values = [encode(row[field]) if field in row else '' for field in fields]
         for key in row:
             if key in allfields:
                 continue
-            allfields[key] = 0
+            allfields.add(key)
             fields.append(key)
-            line_str = line_str + encode_string(str(row[key])) + '\t'
-
-        line_strs.append(line_str[:len(line_str) - 1])
-
-    for field in fields:
-        field_str = field_str + field + '\t'
-
-    field_str = field_str[:len(field_str) - 1]
+            values.append(encode(row[key]))
+        line_strs.append('\t'.join(values))
 
-    body = field_str
-    for line_str in line_strs:
-        body += '\n' + line_str
-
-    return body
+    return '\n'.join(['\t'.join(fields)] + line_strs)
 
 
 def format_field(part):
@@ -163,30 +276,183 @@ def send_packet(output_stream=sys.__stdout__.buffer, meta_info=None, lines=None)
     return
 
 
-def parse_body(input_stream=sys.stdin.buffer, length=0):
+def parse_row(fields, row):
     """
-    Parse body into records
+    Parse one body row into a record
     """
-    records = []
-    if length <= 0:
-        return records
+    record = {}
+    parts = str.split(row, '\t')
+    for i in range(min(len(fields), len(parts))):
+        record[fields[i]] = format_field(parts[i])
+    return record
 
-    try:
-        body = input_stream.read(length).decode("utf-8")
-        rows = str.split(body, '\n')
-        if len(rows) < 2:
-            return records
-
-        fields = str.split(rows[0], '\t')
-        for row in rows[1:]:
-            record = {}
+
+def parse_raw_field(part):
+    """
+    Keep a field value undecoded, only the type prefix is dropped
+    """
+    return SplRawValue(str.partition(part, ',')[2])
+
+
+def make_row_parser(fields, compact=False, projection=None, keep_unrequested=True):
+    """
+    Build the parser turning a body row into a record
+
+    projection is the collection of fields the command reads, None or one
+    containing '*' means all. Other fields are kept as SplRawValue without type
+    conversion or unescaping, or dropped when keep_unrequested is False.
+    """
+    if projection is None or '*' in projection:
+        if compact:
+            schema = SplRowSchema(fields)
+            return lambda row: parse_compact_row(schema, row)
+        return lambda row: parse_row(fields, row)
+
+    columns = []
+    for i, field in enumerate(fields):
+        if field in projection:
+            columns.append((i, field, format_field))
+        elif keep_unrequested:
+            columns.append((i, field, parse_raw_field))
+
+    if compact:
+        schema = SplRowSchema([field for _, field, _ in columns])
+
+        def parse(row):
             parts = str.split(row, '\t')
-            for i in range(len(fields)):
-                if i < len(parts):
-                    record[fields[i]] = format_field(parts[i])
-            records.append(record)
+            width = len(parts)
+            return SplRow(schema, [convert(parts[i]) if i < width else MISSING for i, _, convert in columns])
+    else:
+        def parse(row):
+            parts = str.split(row, '\t')
+            width = len(parts)
+            return {field: convert(parts[i]) for i, field, convert in columns if i < width}
+    return parse
+
+
+def parse_compact_row(schema, row):
+    """
+    Parse one body row into a SplRow sharing schema
+    """
+    width = len(schema.fields)
+    parts = str.split(row, '\t')
+    row_values = [format_field(part) for part in parts[:width]]
+    if len(row_values) < width:
+        row_values.extend([MISSING] * (width - len(row_values)))
+    return SplRow(schema, row_values)
+
 
-        return records
+def iter_body_rows(input_stream=sys.stdin.buffer, length=0, read_size=BODY_READ_SIZE):
+    """
+    Read body from input_stream in slices of at most read_size bytes and yield
+    the rows as decoded strings, header row first
+    """
+    remaining = length
+    pending = bytearray()
+    while remaining > 0:
+        data = input_stream.read(min(read_size, remaining))
+        if not data:
+            raise RuntimeError('Unexpected end of stream, {} body bytes missing'.format(remaining))
+        remaining -= len(data)
+        pending += data
+        if b'\n' not in data:
+            continue
+        rows = pending.split(b'\n')
+        pending = rows.pop()
+        for row in rows:
+            yield row.decode("utf-8")
+    if length > 0:
+        yield pending.decode("utf-8")
+
+
+def iter_buffer_rows(buffer=b'', start=0, end=None):
+    """
+    Yield the rows of a body held in bytes or bytearray buffer[start:end] as
+    decoded strings, header row first. Rows are decoded straight from the
+    buffer without slicing copies.
+    """
+    if end is None:
+        end = len(buffer)
+    view = memoryview(buffer)
+    pos = start
+    while True:
+        newline = buffer.find(b'\n', pos, end)
+        if newline < 0:
+            yield str(view[pos:end], "utf-8")
+            return
+        yield str(view[pos:newline], "utf-8")
+        pos = newline + 1
+
+
+def iter_records(rows, batch_size=None, compact=False, projection=None, keep_unrequested=True):
+    """
+    Parse rows, header row first, into records yielded one at a time or in
+    lists of batch_size records
+
+    With compact the records are SplRow objects sharing one schema instead of
+    dicts. projection and keep_unrequested are passed to make_row_parser.
+    """
+    try:
+        rows = iter(rows)
+        parse = make_row_parser(str.split(next(rows), '\t'), compact, projection, keep_unrequested)
+        if batch_size is None:
+            for row in rows:
+                yield parse(row)
+            return
+
+        batch = []
+        for row in rows:
+            batch.append(parse(row))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
     except Exception as error:
         raise RuntimeError('Failed to parser spl protocol body: {}'.format(error))
 
+
+def iter_body(input_stream=sys.stdin.buffer, length=0, batch_size=None, read_size=BODY_READ_SIZE, compact=False,
+              projection=None, keep_unrequested=True):
+    """
+    Parse body into records incrementally
+
+    The body is read in bounded slices and records are yielded one at a time,
+    or in lists of batch_size records. The generator must be exhausted before
+    the next packet is read from input_stream.
+    """
+    if length <= 0:
+        return iter(())
+    return iter_records(iter_body_rows(input_stream, length, read_size), batch_size, compact,
+                        projection, keep_unrequested)
+
+
+def iter_body_buffer(buffer=b'', start=0, end=None, batch_size=None, compact=False,
+                     projection=None, keep_unrequested=True):
+    """
+    Parse a body already held in buffer[start:end] into records incrementally
+    """
+    if end is None:
+        end = len(buffer)
+    if end <= start:
+        return iter(())
+    return iter_records(iter_buffer_rows(buffer, start, end), batch_size, compact, projection, keep_unrequested)
+
+
+def skip_body(input_stream=sys.stdin.buffer, length=0, read_size=BODY_READ_SIZE):
+    """
+    Discard body without decoding it
+    """
+    remaining = length
+    while remaining > 0:
+        data = input_stream.read(min(read_size, remaining))
+        if not data:
+            raise RuntimeError('Unexpected end of stream, {} body bytes missing'.format(remaining))
+        remaining -= len(data)
+
+
+def parse_body(input_stream=sys.stdin.buffer, length=0):
+    """
+    Parse body into records
+    """
+    return list(iter_body(input_stream, length))
@@ -0,0 +1,60 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import sys
+
+from .spl_packet_utils import *
+from .spl_base_command import SplBaseCommand
+from .spl_metrics import PHASE_HANDLE
+
+
+class SplReducingCommand(SplBaseCommand):
+    """
+    Chunk command which folds every chunk into a running state
+
+    Rows are dropped once reduce has seen them, so memory is bounded by the
+    state instead of the input. finalize turns the state into the records sent
+    back when the engine finishes.
+    """
+
+    def init_state(self):
+        """
+        Create the initial state
+        """
+        return {}
+
+    def reduce(self, state, lines):
+        """
+        Fold one chunk of records into state, return the new state
+        """
+        return state
+
+    def finalize(self, state):
+        """
+        Turn the final state into records
+        """
+        return []
+
+    def process_data(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
+        state = self.init_state()
+        while True:
+            execute_meta = self.process_protocol_execute(input_stream)
+            resp = ''
+            with self.metrics.phase(PHASE_HANDLE):
+                state = self.reduce(state, self.lines)
+                if self.is_finish:
+                    resp = self.finalize(state)
+            self.lines = []
+            self.write_packet(output_stream, execute_meta, resp)
+            if self.is_finish:
+                break
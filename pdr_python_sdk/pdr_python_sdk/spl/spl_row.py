@@ -0,0 +1,126 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from collections.abc import MutableMapping
+
+
+class _Missing(object):
+    """
+    Marker for a schema field the row has no value for
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class SplRowSchema(object):
+    """
+    Field names and their positions, shared by every row of a chunk
+    """
+    __slots__ = ('fields', 'index')
+
+    def __init__(self, fields=None):
+        self.fields = list(fields) if fields is not None else []
+        self.index = {field: i for i, field in enumerate(self.fields)}
+
+
+class SplRow(MutableMapping):
+    """
+    Record backed by a value list and a shared SplRowSchema
+
+    Behaves like the dict records returned by parse_body, but the field names
+    are stored once per chunk instead of once per record. Fields that are not
+    in the schema are kept in a small per row dict, created on first use.
+    """
+    __slots__ = ('schema', 'row_values', 'extra')
+
+    def __init__(self, schema, row_values):
+        self.schema = schema
+        self.row_values = row_values
+        self.extra = None
+
+    def __getitem__(self, key):
+        i = self.schema.index.get(key)
+        if i is not None:
+            value = self.row_values[i]
+            if value is not MISSING:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        i = self.schema.index.get(key)
+        if i is not None:
+            self.row_values[i] = value
+            return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __delitem__(self, key):
+        i = self.schema.index.get(key)
+        if i is not None and self.row_values[i] is not MISSING:
+            self.row_values[i] = MISSING
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        i = self.schema.index.get(key)
+        if i is not None:
+            return self.row_values[i] is not MISSING
+        return self.extra is not None and key in self.extra
+
+    def __iter__(self):
+        for field, value in zip(self.schema.fields, self.row_values):
+            if value is not MISSING:
+                yield field
+        if self.extra is not None:
+            yield from self.extra
+
+    def __len__(self):
+        count = sum(1 for value in self.row_values if value is not MISSING)
+        if self.extra is not None:
+            count += len(self.extra)
+        return count
+
+    def __repr__(self):
+        return 'SplRow({!r})'.format(dict(self))
+
+    def is_plain(self, schema):
+        """
+        Whether the row holds exactly the fields of schema
+        """
+        return self.schema is schema and not self.extra and \
+            all(value is not MISSING for value in self.row_values)
+
+    def copy(self):
+        """
+        Shallow copy sharing the schema, like dict.copy
+        """
+        row = SplRow(self.schema, list(self.row_values))
+        if self.extra:
+            row.extra = dict(self.extra)
+        return row
+
+    def to_dict(self):
+        return dict(self)
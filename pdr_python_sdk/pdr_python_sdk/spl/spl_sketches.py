@@ -0,0 +1,420 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Approximate statistics in bounded memory
+
+    HyperLogLog     distinct counts
+    CountMinSketch  frequencies
+    SpaceSaving     top-k values
+    KLLSketch       quantiles
+
+Every sketch is updated with a whole column at once, a list, a numpy array
+or a pandas Series, nulls are skipped. Sketches of the same parameters are
+combined with merge, so partial sketches of workers or chunks add up to the
+sketch of all their rows, and are serialized with to_bytes and from_bytes.
+
+Values are hashed by their text, so 1 in an int column and "1" in a string
+column are the same value, the way the text format carries them.
+"""
+
+import heapq
+import json
+import math
+import struct
+
+import numpy as np
+import pandas as pd
+
+_HLL_HEADER = struct.Struct('<4sB')
+_CMS_HEADER = struct.Struct('<4sIIq')
+_SPACE_SAVING_HEADER = struct.Struct('<4sI')
+_KLL_HEADER = struct.Struct('<4sIqI')
+_KLL_LEVEL = struct.Struct('<I')
+
+_HLL_MAGIC = b'HLL1'
+_CMS_MAGIC = b'CMS1'
+_SPACE_SAVING_MAGIC = b'SSK1'
+_KLL_MAGIC = b'KLL1'
+
+
+def _column(values):
+    """
+    Values of a column as a one dimensional numpy array
+    """
+    if isinstance(values, pd.Series):
+        values = values.to_numpy(dtype=object, na_value=None)
+    elif not isinstance(values, np.ndarray):
+        values = np.asarray(values, dtype=object)
+    return values.reshape(-1)
+
+
+def _not_null(values):
+    """
+    Values of a column as a numpy array, without nulls
+    """
+    values = _column(values)
+    mask = pd.isna(values)
+    if mask.any():
+        values = values[~mask]
+    return values
+
+
+def hash_values(values):
+    """
+    64 bit hashes of the non-null values of a column
+    """
+    values = _not_null(values)
+    # columns repeat values, each distinct one is turned into text and hashed once
+    codes, uniques = pd.factorize(values)
+    return pd.util.hash_array(np.asarray(uniques, dtype=object))[codes]
+
+
+def _bit_length(values):
+    """
+    Bit length of every item of an uint64 array
+    """
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xffffffff)).astype(np.float64)
+    # frexp exponents are exact bit lengths below 2 ** 53
+    high_length = np.frexp(high)[1]
+    return np.where(high_length > 0, high_length + 32, np.frexp(low)[1])
+
+
+def _check_magic(data, header, magic):
+    if len(data) < header.size:
+        raise RuntimeError('Truncated sketch, {} bytes'.format(len(data)))
+    fields = header.unpack_from(data, 0)
+    if fields[0] != magic:
+        raise RuntimeError('Not a {!r} sketch: {!r}'.format(magic, fields[0]))
+    return fields[1:]
+
+
+class HyperLogLog(object):
+    """
+    Distinct count estimate with a relative error around 1.04 / sqrt(2 ** precision)
+
+    Memory is 2 ** precision bytes, 16KB for the default precision.
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise RuntimeError('HyperLogLog precision must be between 4 and 18, got {}'.format(precision))
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        hashes = hash_values(values)
+        if len(hashes) == 0:
+            return self
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.intp)
+        rest = hashes & np.uint64((1 << width) - 1)
+        ranks = (width + 1 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, ranks)
+        return self
+
+    def add(self, value):
+        return self.update([value])
+
+    def count(self):
+        m = len(self.registers)
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # linear counting is more accurate on small sets
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise RuntimeError('Cannot merge HyperLogLog of precision {} into {}'.format(
+                other.precision, self.precision))
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def to_bytes(self):
+        return _HLL_HEADER.pack(_HLL_MAGIC, self.precision) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        precision, = _check_magic(data, _HLL_HEADER, _HLL_MAGIC)
+        sketch = cls(precision)
+        registers = np.frombuffer(data, dtype=np.uint8, offset=_HLL_HEADER.size)
+        if len(registers) != len(sketch.registers):
+            raise RuntimeError('HyperLogLog has {} registers, expected {}'.format(
+                len(registers), len(sketch.registers)))
+        sketch.registers[:] = registers
+        return sketch
+
+
+class CountMinSketch(object):
+    """
+    Frequency estimates which never undercount
+
+    With probability 1 - exp(-depth) an estimate exceeds the true count by at
+    most e / width times the total count.
+    """
+
+    def __init__(self, width=2048, depth=5):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _positions(self, hashes):
+        # double hashing, row i uses h1 + i * h2
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def update(self, values, counts=1):
+        values = _column(values)
+        counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), values.shape)
+        present = ~pd.isna(values)
+        if not present.all():
+            values, counts = values[present], counts[present]
+        if len(values) == 0:
+            return self
+        positions = self._positions(hash_values(values))
+        for row in range(self.depth):
+            np.add.at(self.table[row], positions[row], counts)
+        self.total += int(counts.sum())
+        return self
+
+    def add(self, value, count=1):
+        return self.update([value], count)
+
+    def estimate(self, values):
+        """
+        Estimated counts of values, as a numpy array of their length, 0 for nulls
+        """
+        values = _column(values)
+        present = ~pd.isna(values)
+        estimates = np.zeros(len(values), dtype=np.int64)
+        positions = self._positions(hash_values(values[present]))
+        estimates[present] = self.table[np.arange(self.depth)[:, None], positions].min(axis=0)
+        return estimates
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise RuntimeError('Cannot merge CountMinSketch {}x{} into {}x{}'.format(
+                other.depth, other.width, self.depth, self.width))
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_bytes(self):
+        return _CMS_HEADER.pack(_CMS_MAGIC, self.width, self.depth, self.total) + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        width, depth, total = _check_magic(data, _CMS_HEADER, _CMS_MAGIC)
+        sketch = cls(width, depth)
+        sketch.total = total
+        sketch.table[:] = np.frombuffer(data, dtype=np.int64, offset=_CMS_HEADER.size).reshape(depth, width)
+        return sketch
+
+
+class SpaceSaving(object):
+    """
+    Top-k values with at most capacity counters
+
+    A counted value is overcounted by at most its error, and any value more
+    frequent than total / capacity is kept. Each batch is counted exactly
+    first, then merged, so the per-row work is the value_counts of the batch.
+    Values are counted by their text, like the values the other sketches hash,
+    and top returns that text.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self.total = 0
+        # value -> [count, error]
+        self.counters = {}
+
+    def _floor(self):
+        """
+        Upper bound of the count of a value without a counter
+        """
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    def _merge_counters(self, counters, floor):
+        own_floor = self._floor()
+        merged = {}
+        for value in self.counters.keys() | counters.keys():
+            count, error = self.counters.get(value, (own_floor, own_floor))
+            other_count, other_error = counters.get(value, (floor, floor))
+            merged[value] = [count + other_count, error + other_error]
+        if len(merged) > self.capacity:
+            merged = dict(heapq.nlargest(self.capacity, merged.items(), key=lambda item: item[1][0]))
+        self.counters = merged
+
+    def update(self, values, counts=None):
+        if counts is None:
+            batch = pd.Series(_not_null(values)).value_counts(sort=False)
+        else:
+            batch = pd.Series(np.asarray(counts, dtype=np.int64), index=pd.Index(_column(values), dtype=object))
+            batch = batch[batch.index.notna()]
+        if len(batch) == 0:
+            return self
+        # distinct values are turned into text once, then values of the same text added up
+        batch.index = pd.Index(batch.index.map(str), dtype=object)
+        batch = batch.groupby(level=0, sort=False).sum()
+        self.total += int(batch.sum())
+        self._merge_counters({value: (count, 0) for value, count in zip(batch.index.tolist(), batch.tolist())}, 0)
+        return self
+
+    def add(self, value, count=1):
+        return self.update([value], [count])
+
+    def top(self, k=None):
+        """
+        The k most frequent values as ``(value, count, error)``, most frequent first
+        """
+        items = sorted(self.counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(value, count, error) for value, (count, error) in items[:k]]
+
+    def merge(self, other):
+        self._merge_counters(other.counters, other._floor())
+        self.total += other.total
+        return self
+
+    def to_bytes(self):
+        counters = [[value, count, error] for value, (count, error) in self.counters.items()]
+        body = json.dumps({'total': self.total, 'counters': counters}).encode('utf-8')
+        return _SPACE_SAVING_HEADER.pack(_SPACE_SAVING_MAGIC, self.capacity) + body
+
+    @classmethod
+    def from_bytes(cls, data):
+        capacity, = _check_magic(data, _SPACE_SAVING_HEADER, _SPACE_SAVING_MAGIC)
+        state = json.loads(bytes(data[_SPACE_SAVING_HEADER.size:]).decode('utf-8'))
+        sketch = cls(capacity)
+        sketch.total = state['total']
+        sketch.counters = {value: [count, error] for value, count, error in state['counters']}
+        return sketch
+
+
+class KLLSketch(object):
+    """
+    Quantiles of numeric values with a rank error around 1.7 / k
+
+    Items live in compactors, level h items weigh 2 ** h. A full compactor is
+    sorted and every other item, from a random offset, moves up a level.
+    Compaction works on numpy arrays, so a batch costs a few sorts.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.total = 0
+        self.seed = seed
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2.0 / 3.0) ** depth)), 2)
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                # an odd item out stays at this level
+                odd = len(items) % 2
+                promoted = items[odd:][int(self.rng.integers(2))::2]
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+                self.levels[level] = items[:odd]
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(_not_null(values), dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self.total += len(values)
+        self._compress()
+        return self
+
+    def add(self, value):
+        return self.update([value])
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """
+        Value at quantile q, or at every quantile of an array q, None when empty
+        """
+        if self.total == 0:
+            return None
+        items, cumulative = self._weighted()
+        ranks = np.asarray(q, dtype=np.float64) * cumulative[-1]
+        index = np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(items) - 1)
+        result = items[index]
+        return result.tolist() if np.ndim(q) > 0 else float(result)
+
+    def rank(self, value):
+        """
+        Estimated fraction of the values not above value
+        """
+        if self.total == 0:
+            return 0.0
+        items, cumulative = self._weighted()
+        index = np.searchsorted(items, value, side='right')
+        return float(cumulative[index - 1] / cumulative[-1]) if index > 0 else 0.0
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise RuntimeError('Cannot merge KLLSketch of k {} into {}'.format(other.k, self.k))
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.total += other.total
+        self._compress()
+        return self
+
+    def to_bytes(self):
+        parts = [_KLL_HEADER.pack(_KLL_MAGIC, self.k, self.total, len(self.levels))]
+        for items in self.levels:
+            parts.append(_KLL_LEVEL.pack(len(items)))
+            parts.append(items.astype('<f8', copy=False).tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data, seed=None):
+        k, total, num_levels = _check_magic(data, _KLL_HEADER, _KLL_MAGIC)
+        sketch = cls(k, seed)
+        sketch.total = total
+        sketch.levels = []
+        offset = _KLL_HEADER.size
+        for _ in range(num_levels):
+            size, = _KLL_LEVEL.unpack_from(data, offset)
+            offset += _KLL_LEVEL.size
+            sketch.levels.append(np.frombuffer(data, dtype='<f8', count=size, offset=offset).copy())
+            offset += size * 8
+        return sketch
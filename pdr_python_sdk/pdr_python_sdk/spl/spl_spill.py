@@ -0,0 +1,116 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import bisect
+import mmap
+import pickle
+import struct
+import tempfile
+
+_LENGTH = struct.Struct('<Q')
+
+
+class SplSpilledLines(object):
+    """
+    Records partly spilled to a temporary file
+
+    spill() appends the in-memory records to the file as one length-prefixed
+    pickle block. Iterating memory-maps the file and unpickles one block at a
+    time before yielding the in-memory tail, so only one block is resident.
+    Indexing unpickles the block holding the record and keeps it for the next
+    index.
+
+    Spilled records are rebuilt on every iteration and index, they are copies:
+    changing one does NOT change the stored record, and the change is lost on
+    the next pass. Build and return new records instead.
+    """
+
+    def __init__(self, lines=None, spill_dir=None):
+        self.tail = list(lines) if lines is not None else []
+        self.spill_dir = spill_dir
+        self.file = None
+        self.spilled_count = 0
+        self.spilled_bytes = 0
+        # file offset of every spilled block and the record count up to its end
+        self.block_offsets = []
+        self.block_ends = []
+        self.cached_block = (None, None)
+
+    def __len__(self):
+        return self.spilled_count + len(self.tail)
+
+    def __iter__(self):
+        if self.file is not None and self.spilled_bytes > 0:
+            self.file.flush()
+            with mmap.mmap(self.file.fileno(), self.spilled_bytes, access=mmap.ACCESS_READ) as view:
+                pos = 0
+                while pos < self.spilled_bytes:
+                    length, = _LENGTH.unpack_from(view, pos)
+                    pos += _LENGTH.size
+                    block = pickle.loads(view[pos:pos + length])
+                    pos += length
+                    yield from block
+        yield from self.tail
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('spilled lines index out of range')
+        if index >= self.spilled_count:
+            return self.tail[index - self.spilled_count]
+        block = bisect.bisect_right(self.block_ends, index)
+        if self.cached_block[0] != block:
+            self.file.flush()
+            self.file.seek(self.block_offsets[block])
+            length, = _LENGTH.unpack(self.file.read(_LENGTH.size))
+            self.cached_block = (block, pickle.loads(self.file.read(length)))
+            self.file.seek(0, 2)
+        start = self.block_ends[block - 1] if block > 0 else 0
+        return self.cached_block[1][index - start]
+
+    def append(self, line):
+        self.tail.append(line)
+
+    def extend(self, lines):
+        self.tail.extend(lines)
+
+    def spill(self):
+        """
+        Move the in-memory records to the temporary file
+        """
+        if len(self.tail) == 0:
+            return
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix='spl-spill-', dir=self.spill_dir)
+        data = pickle.dumps(self.tail, protocol=pickle.HIGHEST_PROTOCOL)
+        self.block_offsets.append(self.spilled_bytes)
+        self.file.write(_LENGTH.pack(len(data)))
+        self.file.write(data)
+        self.spilled_bytes += _LENGTH.size + len(data)
+        self.spilled_count += len(self.tail)
+        self.block_ends.append(self.spilled_count)
+        self.tail = []
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.spilled_count = 0
+        self.spilled_bytes = 0
+        self.block_offsets = []
+        self.block_ends = []
+        self.cached_block = (None, None)
+        self.tail = []
@@ -11,18 +11,294 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import logging
+import queue
 import sys
+import threading
+from collections.abc import Mapping
 
 from .spl_packet_utils import *
 from .spl_base_command import SplBaseCommand
+from .spl_metrics import PHASE_HANDLE
+
+_worker_command = None
+
+
+def _init_worker(command):
+    global _worker_command
+    _worker_command = command
+
+
+def _handle_slice(lines):
+    return _worker_command.streaming_handle(lines)
+
+
+def _is_columns(result):
+    return isinstance(result, dict) or is_dataframe(result)
+
+
+def _column_row_indexes(result):
+    """
+    Row index of every row of a DataFrame or dict of columns, its ROW_INDEX_FIELD or its position
+    """
+    if ROW_INDEX_FIELD in result:
+        return list(result[ROW_INDEX_FIELD])
+    if is_dataframe(result):
+        return list(range(len(result)))
+    return list(range(len(next(iter(result.values()), []))))
+
+
+def _offset_row_index(result, start):
+    """
+    Renumber the rows of a slice result from the slice's position in the chunk
+    """
+    if isinstance(result, list):
+        for i, row in enumerate(result):
+            if isinstance(row, Mapping):
+                row[ROW_INDEX_FIELD] = row.get(ROW_INDEX_FIELD, i) + start
+    elif _is_columns(result):
+        indexes = [index + start for index in _column_row_indexes(result)]
+        if is_dataframe(result):
+            return result.assign(**{ROW_INDEX_FIELD: indexes})
+        result = dict(result)
+        result[ROW_INDEX_FIELD] = indexes
+    return result
+
+
+def _delta_columns(result, export_fields):
+    """
+    Reduce a DataFrame or dict of columns to ROW_INDEX_FIELD and the exported fields
+    """
+    fields = [field for field in (export_fields if export_fields is not None else list(result))
+              if field in result and field != ROW_INDEX_FIELD]
+    indexes = _column_row_indexes(result)
+    if is_dataframe(result):
+        delta = result[fields].copy()
+        delta.insert(0, ROW_INDEX_FIELD, indexes)
+        return delta
+    delta = {ROW_INDEX_FIELD: indexes}
+    delta.update((field, result[field]) for field in fields)
+    return delta
+
+
+def _merge_results(results):
+    """
+    Concatenate the slice results of one chunk in order
+    """
+    if len(results) > 0 and all(is_dataframe(result) for result in results):
+        return sys.modules['pandas'].concat(results, ignore_index=True)
+    merged = []
+    for result in results:
+        if not isinstance(result, list):
+            raise RuntimeError('streaming_handle must return a list or a DataFrame when run in worker processes, '
+                               'got {}'.format(type(result)))
+        merged.extend(result)
+    return merged
 
 
 class SplStreamingBatchCommand(SplBaseCommand):
+    def __init__(self):
+        super(SplStreamingBatchCommand, self).__init__()
+        # read and decode the next chunk and encode and write the previous one
+        # on background threads while streaming_handle runs
+        self.pipelined = False
+        # number of forked worker processes streaming_handle runs in, 0 runs it in this process
+        self.worker_processes = 0
+        # chunks smaller than this are not split across workers
+        self.min_rows_per_worker = 1000
+        self.worker_pool = None
+        # reader and writer threads of the pipelined loop, no worker is forked while they run
+        self.pipeline_threads = []
+        # send only the fields streaming_handle adds or changes, see delta_lines
+        self.delta_output = False
+        self.delta_negotiated = False
+
+    def negotiate_getinfo(self):
+        super(SplStreamingBatchCommand, self).negotiate_getinfo()
+        if self.delta_output and CAPABILITY_DELTA_OUTPUT in self.peer_capabilities():
+            self.delta_negotiated = True
+            self.metainfo['output_mode'] = CAPABILITY_DELTA_OUTPUT
+
     def process_data(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
+        try:
+            if self.pipelined:
+                self.process_data_pipelined(argv, input_stream, output_stream)
+            else:
+                self.process_data_sequential(argv, input_stream, output_stream)
+        finally:
+            self.close_worker_pool()
+
+    def process_data_sequential(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
         while True:
             execute_meta = self.process_protocol_execute(input_stream)
-            resp = self.streaming_handle(self.lines)
-            send_packet(output_stream, execute_meta, resp)
+            resp = self.handle_lines(self.lines)
+            self.write_packet(output_stream, execute_meta, resp)
             self.lines = []
             if self.is_finish:
                 break
+
+    def process_data_pipelined(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
+        """
+        Handle chunk N while a reader thread prefetches chunk N+1 and a writer
+        thread sends chunk N-1. Both queues are FIFO, so responses keep the
+        order of the requests.
+        """
+        read_queue = queue.Queue(maxsize=1)
+        write_queue = queue.Queue(maxsize=1)
+        write_errors = []
+
+        def read_chunks():
+            try:
+                while True:
+                    execute_meta, lines = self.read_execute(input_stream)
+                    read_queue.put((execute_meta, lines))
+                    if execute_meta['finished']:
+                        break
+            except Exception as error:
+                read_queue.put(error)
+
+        def write_chunks():
+            while True:
+                item = write_queue.get()
+                if item is None:
+                    break
+                if len(write_errors) > 0:
+                    continue
+                try:
+                    self.write_packet(output_stream, item[0], item[1])
+                except Exception as error:
+                    write_errors.append(error)
+
+        if self.worker_processes > 0:
+            # fork the workers before the threads start, a child forked later could
+            # inherit a lock one of them holds and block on it
+            self.get_worker_pool()
+        reader = threading.Thread(target=read_chunks, name='spl-reader', daemon=True)
+        writer = threading.Thread(target=write_chunks, name='spl-writer', daemon=True)
+        self.pipeline_threads = [reader, writer]
+        reader.start()
+        writer.start()
+        try:
+            while True:
+                item = read_queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                execute_meta, self.lines = item
+                self.is_finish = execute_meta['finished']
+                resp = self.handle_lines(self.lines)
+                write_queue.put((execute_meta, resp))
+                self.lines = []
+                if len(write_errors) > 0:
+                    raise write_errors[0]
+                if self.is_finish:
+                    break
+        finally:
+            write_queue.put(None)
+            writer.join()
+        if len(write_errors) > 0:
+            raise write_errors[0]
+
+    def handle_lines(self, lines):
+        """
+        Run streaming_handle on a chunk and return the lines to send
+        """
+        with self.metrics.phase(PHASE_HANDLE):
+            resp = self.streaming_handle_in_workers(lines)
+            if self.delta_output:
+                resp = self.delta_lines(lines, resp)
+        return resp
+
+    def streaming_handle_in_workers(self, lines):
+        """
+        Run streaming_handle, split across the worker pool when enabled
+
+        Workers are forked once, for the first chunk large enough to split or
+        before the pipelined threads start, and reused for every chunk.
+        Each runs streaming_handle on a slice of the rows, so changes a handler
+        makes to self in a worker are not seen by this process. With
+        delta_output, the ROW_INDEX_FIELD of the rows a slice returns is
+        shifted by the slice's start.
+        """
+        if self.worker_processes <= 0 or len(lines) < 2 * self.min_rows_per_worker:
+            return self.streaming_handle(lines)
+        pool = self.get_worker_pool()
+        if pool is None:
+            return self.streaming_handle(lines)
+
+        slices = min(self.worker_processes, len(lines) // self.min_rows_per_worker)
+        size = -(-len(lines) // slices)
+        starts = range(0, len(lines), size)
+        results = list(pool.map(_handle_slice, [lines[start:start + size] for start in starts]))
+        if self.delta_output:
+            # row indexes of each slice start at 0, delta_lines needs them within the chunk
+            results = [_offset_row_index(result, start) for result, start in zip(results, starts)]
+        return _merge_results(results)
+
+    def delta_lines(self, lines, resp):
+        """
+        Reduce a handler result to the fields it adds or changes
+
+        Every result row belongs to the input row at its ROW_INDEX_FIELD, or at
+        its own position when it has none, None rows only hold a position.
+        Only fields listed by config_export_fields are taken, all of the row's
+        fields for ['*']. When the engine negotiated delta output those fields are sent with the
+        row index, otherwise they are merged into the input rows here and every
+        input row is sent back.
+
+        A DataFrame or dict of columns follows the same rules, a ROW_INDEX_FIELD
+        column or the row position giving the input row. It is reduced to that
+        column and the exported ones when delta output was negotiated, and sent
+        as it is otherwise.
+        """
+        export_fields = None if '*' in self.export_fields else self.export_fields
+        if _is_columns(resp):
+            return _delta_columns(resp, export_fields) if self.delta_negotiated else resp
+        if not isinstance(resp, list):
+            return resp
+        deltas = []
+        for i, row in enumerate(resp):
+            if row is None:
+                continue
+            index = row.get(ROW_INDEX_FIELD, i)
+            fields = export_fields if export_fields is not None else list(row)
+            if self.delta_negotiated:
+                delta = {ROW_INDEX_FIELD: index}
+                for field in fields:
+                    if field in row and field != ROW_INDEX_FIELD:
+                        delta[field] = row[field]
+                deltas.append(delta)
+                continue
+            line = lines[index]
+            if line is row:
+                continue
+            for field in fields:
+                if field in row and field != ROW_INDEX_FIELD:
+                    line[field] = row[field]
+        return deltas if self.delta_negotiated else lines
+
+    def get_worker_pool(self):
+        """
+        The worker pool, forked on first use, None when this platform cannot fork
+        """
+        if self.worker_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                logging.warning('worker processes need the fork start method, handling chunks in process')
+                self.worker_processes = 0
+                return None
+            if any(thread.is_alive() for thread in self.pipeline_threads):
+                raise RuntimeError('Cannot fork worker processes while the pipelined reader and writer threads run')
+            pool = ProcessPoolExecutor(max_workers=self.worker_processes,
+                                       mp_context=multiprocessing.get_context('fork'),
+                                       initializer=_init_worker, initargs=(self,))
+            # workers of the fork context all start on the first task, run one now
+            pool.submit(int).result()
+            self.worker_pool = pool
+        return self.worker_pool
+
+    def close_worker_pool(self):
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            self.worker_pool = None
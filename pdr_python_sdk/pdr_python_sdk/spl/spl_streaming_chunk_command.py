@@ -11,21 +11,58 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import logging
 import sys
 
 from .spl_packet_utils import *
 from .spl_base_command import SplBaseCommand
+from .spl_metrics import PHASE_HANDLE
+from .spl_spill import SplSpilledLines
 
 
 class SplStreamingChunkCommand(SplBaseCommand):
+    def __init__(self):
+        super(SplStreamingChunkCommand, self).__init__()
+        # body bytes buffered in memory before records are spilled to a temporary
+        # file, None keeps everything in memory
+        self.memory_budget = None
+        # directory for the spill file, None uses the system temporary directory
+        self.spill_dir = None
+        self.buffered_bytes = 0
 
     def process_data(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
         if argv is None:
             argv = sys.argv
-        while True:
-            execute_meta = self.process_protocol_execute(input_stream)
-            if self.is_finish:
-                resp = self.streaming_handle(self.lines)
-                send_packet(output_stream, execute_meta, resp)
-                break
-            send_packet(output_stream, execute_meta, '')
+        try:
+            while True:
+                execute_meta = self.process_protocol_execute(input_stream)
+                self.spill_if_needed()
+                if self.is_finish:
+                    with self.metrics.phase(PHASE_HANDLE, self.metrics.last_chunk()):
+                        resp = self.streaming_handle(self.lines)
+                    self.write_packet(output_stream, execute_meta, resp)
+                    break
+                self.write_packet(output_stream, execute_meta, '')
+        finally:
+            if isinstance(self.lines, SplSpilledLines):
+                self.lines.close()
+
+    def spill_if_needed(self):
+        """
+        Spill buffered records once the chunk bodies received exceed memory_budget
+
+        After a spill self.lines is a SplSpilledLines, streaming_handle then gets
+        a lazy sequence of record copies: changes made to them are lost, it must
+        return new records instead of changing and returning the ones it reads.
+        """
+        if self.memory_budget is None or self.channel is None:
+            return
+        self.buffered_bytes += self.channel.body_length
+        if self.buffered_bytes <= self.memory_budget:
+            return
+        if not isinstance(self.lines, SplSpilledLines):
+            logging.warning('spl chunk buffer exceeds {} bytes, spilling records to disk, streaming_handle gets '
+                            'copies of them'.format(self.memory_budget))
+            self.lines = SplSpilledLines(self.lines, self.spill_dir)
+        self.lines.spill()
+        self.buffered_bytes = 0
@@ -0,0 +1,343 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import math
+import sys
+from collections import deque
+from collections.abc import Mapping
+
+from .spl_packet_utils import *
+from .spl_base_command import SplBaseCommand
+from .spl_metrics import PHASE_HANDLE
+
+WINDOW_TUMBLING = 'tumbling'
+WINDOW_SLIDING = 'sliding'
+WINDOW_SESSION = 'session'
+
+TIME_ORDER_ASC = 'asc'
+TIME_ORDER_DESC = 'desc'
+
+WINDOW_START_FIELD = '_window_start'
+WINDOW_END_FIELD = '_window_end'
+
+
+class _Windows(object):
+    """
+    Windows over times which only grow
+
+    Descending input is fed with negated times, windows are then closed on
+    the right, so that once mapped back they are the same [start, end)
+    windows as for ascending input.
+    """
+
+    def __init__(self, command, descending=False):
+        self.command = command
+        self.descending = descending
+
+    def emit(self, key, start, end, state, out):
+        if self.descending:
+            start, end = -end, -start
+        self.command.emit_window(key, start, end, state, out)
+
+
+class TumblingWindows(_Windows):
+    """
+    Fixed windows [k * size, (k + 1) * size), one open window per group
+
+    Only the window state is kept, rows are not.
+    """
+
+    def __init__(self, command, size, descending=False):
+        super(TumblingWindows, self).__init__(command, descending)
+        self.size = size
+        # key -> [start, state]
+        self.groups = {}
+
+    def _start(self, time):
+        if self.descending:
+            return math.ceil(time / self.size) * self.size - self.size
+        return math.floor(time / self.size) * self.size
+
+    def _closed(self, start, watermark):
+        if self.descending:
+            return start + self.size < watermark
+        return start + self.size <= watermark
+
+    def add(self, key, time, row, out):
+        start = self._start(time)
+        group = self.groups.get(key)
+        if group is not None and group[0] != start:
+            self.emit(key, group[0], group[0] + self.size, group[1], out)
+            group = None
+        if group is None:
+            group = self.groups[key] = [start, self.command.init_window_state()]
+        self.command.window_add(group[1], row)
+
+    def advance(self, watermark, out):
+        for key, group in list(self.groups.items()):
+            if self._closed(group[0], watermark):
+                self.emit(key, group[0], group[0] + self.size, group[1], out)
+                del self.groups[key]
+
+    def flush(self, out):
+        for key, group in self.groups.items():
+            self.emit(key, group[0], group[0] + self.size, group[1], out)
+        self.groups.clear()
+
+
+class SlidingWindows(_Windows):
+    """
+    Windows [end - size, end) for every end on a multiple of slide
+
+    Each group keeps the rows of its current window in a deque and its state
+    is updated incrementally: every row is added once and removed once, so the
+    cost per row is O(1) amortized however much windows overlap. Windows
+    without rows are skipped.
+    """
+
+    def __init__(self, command, size, slide, descending=False):
+        super(SlidingWindows, self).__init__(command, descending)
+        self.size = size
+        self.slide = slide
+        # key -> [next window end, deque of (time, row), state]
+        self.groups = {}
+
+    def _first_end(self, time):
+        if self.descending:
+            return math.ceil(time / self.slide) * self.slide
+        return math.floor(time / self.slide) * self.slide + self.slide
+
+    def _past(self, time, end):
+        """
+        Whether time falls after the window ending at end
+        """
+        return time > end if self.descending else time >= end
+
+    def _close(self, key, group, out):
+        """
+        Emit the window ending at group's next end and move to the following one
+        """
+        end, rows, state = group
+        start = end - self.size
+        while len(rows) > 0 and (rows[0][0] <= start if self.descending else rows[0][0] < start):
+            self.command.window_remove(state, rows.popleft()[1])
+        if len(rows) > 0:
+            self.emit(key, start, end, state, out)
+        group[0] = end + self.slide
+
+    def add(self, key, time, row, out):
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = [self._first_end(time), deque(), self.command.init_window_state()]
+        while self._past(time, group[0]):
+            if len(group[1]) == 0:
+                group[0] = max(group[0], self._first_end(time))
+                break
+            self._close(key, group, out)
+        group[1].append((time, row))
+        self.command.window_add(group[2], row)
+
+    def advance(self, watermark, out):
+        for key, group in list(self.groups.items()):
+            while self._past(watermark, group[0]) and len(group[1]) > 0:
+                self._close(key, group, out)
+            if len(group[1]) == 0:
+                del self.groups[key]
+
+    def flush(self, out):
+        for key, group in self.groups.items():
+            while len(group[1]) > 0:
+                self._close(key, group, out)
+        self.groups.clear()
+
+
+class SessionWindows(_Windows):
+    """
+    Windows of rows no more than gap apart, reported as [first time, last time]
+    """
+
+    def __init__(self, command, gap, descending=False):
+        super(SessionWindows, self).__init__(command, descending)
+        self.gap = gap
+        # key -> [start, last time, state]
+        self.groups = {}
+
+    def add(self, key, time, row, out):
+        group = self.groups.get(key)
+        if group is not None and time - group[1] > self.gap:
+            self.emit(key, group[0], group[1], group[2], out)
+            group = None
+        if group is None:
+            group = self.groups[key] = [time, time, self.command.init_window_state()]
+        group[1] = time
+        self.command.window_add(group[2], row)
+
+    def advance(self, watermark, out):
+        for key, group in list(self.groups.items()):
+            if watermark - group[1] > self.gap:
+                self.emit(key, group[0], group[1], group[2], out)
+                del self.groups[key]
+
+    def flush(self, out):
+        for key, group in self.groups.items():
+            self.emit(key, group[0], group[1], group[2], out)
+        self.groups.clear()
+
+
+class SplWindowCommand(SplBaseCommand):
+    """
+    Command aggregating rows over time windows which span chunks
+
+    Rows must arrive sorted on time_field, in the time_order the command is
+    configured with: TIME_ORDER_ASC, oldest first, by default, or
+    TIME_ORDER_DESC, newest first, which is how search results usually come
+    back. A row out of that order is counted in late_rows and dropped, and
+    the command fails once more than max_late_fraction of the timed rows were
+    dropped, since its windows would be wrong. Windows are emitted as soon as
+    they close, in the response to the chunk that closed them, and the rest
+    when the engine finishes. State is kept per group_by key and per
+    open window only, through the init_window_state, window_add,
+    window_remove and window_emit hooks.
+    """
+
+    def __init__(self):
+        super(SplWindowCommand, self).__init__()
+        # WINDOW_TUMBLING, WINDOW_SLIDING or WINDOW_SESSION
+        self.window_type = WINDOW_TUMBLING
+        # numeric field holding the row time, window sizes are in its unit
+        self.time_field = '_time'
+        # TIME_ORDER_ASC or TIME_ORDER_DESC, the order rows arrive in
+        self.time_order = TIME_ORDER_ASC
+        # fail when more of the timed rows than this are out of order
+        self.max_late_fraction = 0.5
+        # fields whose values key separate windows
+        self.group_by = []
+        # length of tumbling and sliding windows
+        self.window_size = 60
+        # distance between the ends of sliding windows, window_size when None
+        self.window_slide = None
+        # inactivity which closes a session window
+        self.session_gap = 60
+        self.windows = None
+        # latest time seen, negated in descending order
+        self.watermark = None
+        self.timed_rows = 0
+        self.late_rows = 0
+        self.untimed_rows = 0
+
+    def init_window_state(self):
+        """
+        Create the state of a new window
+        """
+        return {'count': 0}
+
+    def window_add(self, state, row):
+        """
+        Add a row to a window state
+        """
+        state['count'] += 1
+
+    def window_remove(self, state, row):
+        """
+        Remove a row added earlier, only sliding windows call it
+        """
+        state['count'] -= 1
+
+    def window_emit(self, key, start, end, state):
+        """
+        Turn a closed window into a record, a list of records or None
+        """
+        record = dict(zip(self.group_by, key))
+        record[WINDOW_START_FIELD] = start
+        record[WINDOW_END_FIELD] = end
+        record.update(state)
+        return record
+
+    def emit_window(self, key, start, end, state, out):
+        result = self.window_emit(key, start, end, state)
+        if result is None:
+            return
+        if isinstance(result, Mapping):
+            out.append(result)
+        else:
+            out.extend(result)
+
+    def make_windows(self):
+        if self.time_order not in (TIME_ORDER_ASC, TIME_ORDER_DESC):
+            raise RuntimeError('Unknown time order: {}'.format(self.time_order))
+        descending = self.time_order == TIME_ORDER_DESC
+        if self.window_type == WINDOW_TUMBLING:
+            return TumblingWindows(self, self.window_size, descending)
+        if self.window_type == WINDOW_SLIDING:
+            slide = self.window_slide if self.window_slide is not None else self.window_size
+            return SlidingWindows(self, self.window_size, slide, descending)
+        if self.window_type == WINDOW_SESSION:
+            return SessionWindows(self, self.session_gap, descending)
+        raise RuntimeError('Unknown window type: {}'.format(self.window_type))
+
+    def row_time(self, row):
+        """
+        Time of a row as a number, None when it has none
+        """
+        try:
+            value = row[self.time_field]
+            if type(value) is int or type(value) is float:
+                return value
+            return float(value)
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def window_lines(self, lines):
+        """
+        Feed one chunk of rows to the windows, return the records of the windows it closed
+        """
+        out = []
+        windows = self.windows
+        group_by = self.group_by
+        # descending times are negated, windows always see them grow
+        sign = -1 if windows.descending else 1
+        for row in lines:
+            time = self.row_time(row)
+            if time is None:
+                self.untimed_rows += 1
+                continue
+            self.timed_rows += 1
+            time = sign * time
+            if self.watermark is not None and time < self.watermark:
+                self.late_rows += 1
+                continue
+            self.watermark = time
+            windows.add(tuple(row.get(field, '') for field in group_by), time, row, out)
+        if self.late_rows > self.max_late_fraction * self.timed_rows:
+            raise RuntimeError('{} of {} rows are not in {} {} order, check time_order'.format(
+                self.late_rows, self.timed_rows, self.time_order, self.time_field))
+        if self.watermark is not None:
+            windows.advance(self.watermark, out)
+        return out
+
+    def process_data(self, argv=None, input_stream=sys.stdin.buffer, output_stream=sys.__stdout__.buffer):
+        self.windows = self.make_windows()
+        while True:
+            execute_meta = self.process_protocol_execute(input_stream)
+            with self.metrics.phase(PHASE_HANDLE):
+                resp = self.window_lines(self.lines)
+                if self.is_finish:
+                    self.windows.flush(resp)
+            self.lines = []
+            self.write_packet(output_stream, execute_meta, resp)
+            if self.is_finish:
+                break
+        if self.late_rows > 0 or self.untimed_rows > 0:
+            logging.warning('window command dropped {} late rows and {} rows without {}'.format(
+                self.late_rows, self.untimed_rows, self.time_field))
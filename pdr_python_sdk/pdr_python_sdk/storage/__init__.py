@@ -1,2 +1,3 @@
 from __future__ import absolute_import
 from .client import *
+from .lookup import *
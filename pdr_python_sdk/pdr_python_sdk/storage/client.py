@@ -5,6 +5,8 @@ from pdr_python_sdk.client import PandoraConnection
 
 BASE_V2_PATH = "/storage/v2/collections/{}"
 BASE_V1_PATH = "/storage/collections/{}"
+# records a data query returns, it takes no paging params along with a query
+QUERY_PAGE_SIZE = 10
 
 
 __all__ = [
@@ -127,6 +129,52 @@ class StorageTableData(object):
         """
         return self.service.get(self.path + '/{}'.format(id))
 
+    def query_by_ids(self, ids, field="id", batch_size=1):
+        """
+        Get the records whose field is one of ids.
+
+        A query ignores pageNo and pageSize and returns only the first page of its
+        matches, QUERY_PAGE_SIZE records, so at most that many ids go in one query.
+        With batch_size 1, the default, every id is looked up with a documented
+        field=value query. A larger batch joins the comparisons with "or", for
+        servers which accept it. The ids a full page of a batch left out are looked
+        up one by one.
+        :param ids: Values to look for, compared as they are typed, 1 and '1' are not the same. type ``list``
+        :param field: The field holding them, id by default. type ``string``
+        :param batch_size: The most values in one query, at most QUERY_PAGE_SIZE. type ``integer``
+        :return: The first record found by the text of each value, None when the table has no record for it.
+            rtype: ``dict``
+        """
+        ids = list(ids)
+        batch_size = max(1, min(batch_size, QUERY_PAGE_SIZE))
+        records = {}
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            if self._query_values(batch, field, records) or len(batch) == 1:
+                continue
+            for value in batch:
+                if str(value) not in records:
+                    self._query_values([value], field, records)
+        return records
+
+    def _query_values(self, values, field, records):
+        """
+        Query the records of values into records, None for the values without one.
+        :return: Whether the first page held every match. rtype: ``bool``
+        """
+        query = " or ".join("{}={}".format(field, quote_value(value)) for value in values)
+        response = self.query(query=query)
+        data = response.get("data") or []
+        total = response.get("total")
+        for record in data:
+            records.setdefault(str(record.get(field)), record)
+        complete = total <= len(data) if total is not None else len(data) < QUERY_PAGE_SIZE
+        if complete or len(values) == 1:
+            # a single value is found by any of its records
+            for value in values:
+                records.setdefault(str(value), None)
+        return complete
+
     def insert(self, data):
         """
         Insert record into this table. An id field will be auto generated in the data.
@@ -189,4 +237,14 @@ def get_object(element):
     if isinstance(element, str):
         return json.loads(element)
     else:
-        return element
\ No newline at end of file
+        return element
+
+def quote_value(value):
+    """
+    Write value for a query, numbers as they are and anything else in double quotes, as in title="lihong"
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"'))
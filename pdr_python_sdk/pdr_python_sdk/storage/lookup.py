@@ -0,0 +1,188 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from ..spl.spl_packet_utils import SplRawValue, decode_string
+
+__all__ = [
+    "LookupCache",
+    "StorageLookup"
+]
+
+_MISSING = object()
+
+
+class LookupCache(object):
+    """
+    Bounded LRU cache whose entries expire ttl seconds after they are stored
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_size=10000, ttl=300, clock=time.monotonic):
+        self.max_size = max_size
+        # seconds an entry is served for, None keeps entries until evicted
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_many(self, keys):
+        """
+        :return: ``(found, missing)``, the cached values by key and the keys to fetch
+        """
+        found = {}
+        missing = []
+        now = self.clock()
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key, _MISSING)
+                if entry is not _MISSING and (entry[0] is None or entry[0] > now):
+                    self.entries.move_to_end(key)
+                    found[key] = entry[1]
+                    continue
+                if entry is not _MISSING:
+                    del self.entries[key]
+                missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, values):
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            for key, value in values.items():
+                self.entries[key] = (expires, value)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class StorageLookup(object):
+    """
+    Enrich rows with records of a storage table, fetched once per key and cached
+
+    Each call collects the distinct keys it is given, serves what the cache
+    holds and fetches only the rest, with one query per batch_size keys. Keys
+    the table has no record for are cached as None, so they are not fetched
+    again before they expire.
+
+    Keys are converted with key_type before they are queried and compared,
+    int for the generated id field by default, so that an id read from a text
+    column is queried as a number and 1 and "1" are the same key.
+
+    Keep one instance on the command so that the cache spans the chunks of
+    a search, for example::
+
+        def after_getinfo(self):
+            self.users = StorageLookup(service.storage("app").data("users"), "user_id")
+
+        def streaming_handle(self, lines):
+            return self.users.enrich(lines, "uid", fields=["name"])
+
+    Worker processes each get their own copy of the cache.
+    """
+
+    def __init__(self, table_data=None, key_field="id", fetch=None, cache=None, max_size=10000, ttl=300,
+                 batch_size=1, key_type=None):
+        """
+        :param table_data: The table to look in. type :class:`StorageTableData`
+        :param key_field: The table field holding the keys. type ``string``
+        :param fetch: Used instead of table_data, takes a list of keys and returns by key text a record, or None
+            when the table has none. Keys left out are not cached. type ``callable``
+        :param cache: Shared with other lookups instead of a new one. type :class:`LookupCache`
+        :param batch_size: Keys in one table query, see :meth:`StorageTableData.query_by_ids`. type ``integer``
+        :param key_type: Converts keys before they are queried, int when key_field is id, None keeps them as
+            they are. type ``callable``
+        """
+        if fetch is None:
+            if table_data is None:
+                raise Exception('StorageLookup needs a table_data or a fetch function.')
+
+            def fetch(keys):
+                return table_data.query_by_ids(keys, key_field, batch_size)
+        self.fetch = fetch
+        self.key_field = key_field
+        if key_type is None and key_field == "id":
+            key_type = int
+        self.key_type = key_type
+        self.cache = cache if cache is not None else LookupCache(max_size, ttl)
+        self.fetches = 0
+
+    def lookup(self, keys):
+        """
+        :param keys: Key values, with repeats. type ``iterable``
+        :return: Record or None by key text. rtype: ``dict``
+        """
+        distinct = OrderedDict()
+        for key in keys:
+            key = self.normalize_key(key)
+            if key is not None:
+                distinct.setdefault(str(key), key)
+        records, missing = self.cache.get_many(distinct)
+        if len(missing) > 0:
+            self.fetches += 1
+            fetched = self.fetch([distinct[key] for key in missing])
+            fetched = {key: fetched[key] for key in missing if key in fetched}
+            self.cache.put_many(fetched)
+            records.update(fetched)
+            for key in missing:
+                records.setdefault(key, None)
+        return records
+
+    def normalize_key(self, key):
+        """
+        Key converted with key_type, None for an empty or unconvertible key
+        """
+        if key is None or key == "":
+            return None
+        if type(key) is SplRawValue:
+            key = decode_string(key)
+        if self.key_type is None:
+            return key
+        try:
+            return self.key_type(key)
+        except (TypeError, ValueError):
+            return None
+
+    def enrich(self, lines, row_field, fields=None, prefix=""):
+        """
+        Copy the fields of the record matching row_field into every row.
+        :param lines: Rows to enrich in place. type ``list``
+        :param row_field: The row field holding the key. type ``string``
+        :param fields: Record fields to copy, all but the key field when None. type ``list``
+        :param prefix: Prepended to the names of the copied fields. type ``string``
+        :return: lines
+        """
+        records = self.lookup(line.get(row_field) for line in lines)
+        for line in lines:
+            key = self.normalize_key(line.get(row_field))
+            record = records.get(str(key)) if key is not None else None
+            if record is None:
+                continue
+            for field in (fields if fields is not None else record):
+                if field in record and (fields is not None or field != self.key_field):
+                    line[prefix + field] = record[field]
+        return lines
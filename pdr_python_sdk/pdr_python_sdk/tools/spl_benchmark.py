@@ -0,0 +1,191 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import time
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.spl.spl_columnar_utils import *
+
+TYPE_NAMES = {
+    'string': TYPE_STRING,
+    'int': TYPE_INT,
+    'float': TYPE_FLOAT,
+    'null': TYPE_NULL,
+    'boolean': TYPE_BOOLEAN,
+}
+
+_SPECIALS = ('\t', '\n', '\\')
+
+
+def _make_value(rng, column_type, escape_density):
+    if column_type == TYPE_INT:
+        return rng.randint(-10 ** 9, 10 ** 9)
+    if column_type == TYPE_FLOAT:
+        return rng.uniform(-1e6, 1e6)
+    if column_type == TYPE_BOOLEAN:
+        return rng.random() < 0.5
+    if column_type == TYPE_NULL:
+        return None
+    value = '%016x' % rng.getrandbits(64)
+    if rng.random() < escape_density:
+        at = rng.randint(0, len(value))
+        value = value[:at] + rng.choice(_SPECIALS) + value[at:]
+    return value
+
+
+def _encode_cell(column_type, value):
+    if column_type == TYPE_NULL:
+        return '%d,' % TYPE_NULL
+    if column_type == TYPE_STRING:
+        return '%d,%s' % (TYPE_STRING, encode_string(value))
+    if column_type == TYPE_BOOLEAN:
+        return '%d,%s' % (TYPE_BOOLEAN, 'true' if value else 'false')
+    return '%d,%s' % (column_type, value)
+
+
+def generate_chunk(rows=10000, columns=10, type_mix=('string', 'int', 'float', 'boolean'), escape_density=0.0,
+                   seed=0):
+    """
+    Build a synthetic chunk
+
+    Column types cycle through type_mix, escape_density is the share of string
+    values containing a tab, newline or backslash.
+
+    :return: ``(body, records)``, the encoded input body and the records it decodes to
+    """
+    rng = random.Random(seed)
+    types = [TYPE_NAMES[name] for name in type_mix]
+    fields = ['f%d' % i for i in range(columns)]
+    field_types = [types[i % len(types)] for i in range(columns)]
+    lines = ['\t'.join(fields)]
+    records = []
+    for _ in range(rows):
+        values = [_make_value(rng, column_type, escape_density) for column_type in field_types]
+        lines.append('\t'.join(_encode_cell(column_type, value) for column_type, value in zip(field_types, values)))
+        records.append({field: '' if value is None else value for field, value in zip(fields, values)})
+    return '\n'.join(lines).encode('utf-8'), records
+
+
+def _best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _result(seconds, rows, size):
+    return {
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None,
+        'bytes_per_second': round(size / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def run_benchmark(rows=10000, columns=10, type_mix=('string', 'int', 'float', 'boolean'), escape_density=0.0,
+                  repeat=5, seed=0):
+    """
+    Time the packet codec on one synthetic chunk, best of repeat runs
+
+    parse_head and parse_meta run on 1000 packets, their rows are packets.
+
+    :return: json serializable dict of results
+    """
+    body, records = generate_chunk(rows, columns, type_mix, escape_density, seed)
+    meta = json.dumps({'action': 'execute', 'finished': False}).encode('utf-8')
+    head = ('chunked 1.0,%s,%s\n' % (len(meta), len(body))).encode('utf-8')
+    cells = [cell for line in body.decode('utf-8').split('\n')[1:] for cell in line.split('\t')]
+    encoded = convert_body_to_str(records).encode('utf-8')
+    heads = head * 1000
+
+    def decode_heads():
+        stream = io.BytesIO(heads)
+        for _ in range(1000):
+            parse_head(stream)
+
+    def decode_meta():
+        for _ in range(1000):
+            parse_meta(io.BytesIO(meta), len(meta))
+
+    def decode_fields():
+        for cell in cells:
+            format_field(cell)
+
+    results = {
+        'parse_head': _result(_best_time(decode_heads, repeat), 1000, len(heads)),
+        'parse_meta': _result(_best_time(decode_meta, repeat), 1000, 1000 * len(meta)),
+        'parse_body': _result(_best_time(lambda: parse_body(io.BytesIO(body), len(body)), repeat), rows, len(body)),
+        'parse_body_columns': _result(_best_time(lambda: parse_body_columns(io.BytesIO(body), len(body)), repeat),
+                                      rows, len(body)),
+        'format_field': _result(_best_time(decode_fields, repeat), rows, len(body)),
+        'convert_body_to_str': _result(_best_time(lambda: convert_body_to_str(records), repeat), rows, len(encoded)),
+        'send_packet': _result(_best_time(lambda: send_packet(io.BytesIO(), {}, records), repeat), rows,
+                               len(encoded)),
+    }
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'rows': rows,
+            'columns': columns,
+            'type_mix': list(type_mix),
+            'escape_density': escape_density,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'body_bytes': len(body),
+        'results': results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the spl packet codec")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per chunk")
+    parser.add_argument("--columns", type=int, default=10, help="columns per chunk")
+    parser.add_argument("--type-mix", default="string,int,float,boolean",
+                        help="column types, cycled across columns: {}".format(",".join(TYPE_NAMES)))
+    parser.add_argument("--escape-density", type=float, default=0.0,
+                        help="share of string values holding a tab, newline or backslash")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the json report to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def benchmark(argv=None):
+    args = parse_args(argv)
+    type_mix = [name for name in args.type_mix.split(",") if name]
+    for name in type_mix:
+        if name not in TYPE_NAMES:
+            raise SystemExit("unknown type in --type-mix: {}".format(name))
+    report = run_benchmark(args.rows, args.columns, type_mix, args.escape_density, args.repeat, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,148 @@
+"""
+Copyright 2020 Qiniu Cloud (qiniu.com)
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+ http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import difflib
+import io
+import json
+import os
+import sys
+import time
+
+from pdr_python_sdk.common.classes import load_class
+from pdr_python_sdk.common.recording import RECORDING_INPUT_SUFFIX, RECORDING_OUTPUT_SUFFIX
+from pdr_python_sdk.spl import META_BODY_FORMAT, BODY_FORMAT_BINARY_COLUMNS, convert_body_to_str, parse_head, \
+    parse_meta
+
+# meta keys whose values change from run to run
+VOLATILE_META_KEYS = ('error_traceback', 'metrics')
+
+
+def read_packets(data):
+    """
+    Split a recorded spl byte stream into ``(meta, body)`` packets, bodies as text
+
+    Binary column bodies are decoded and written out in the text format.
+    """
+    stream = io.BytesIO(data)
+    packets = []
+    while stream.tell() < len(data):
+        meta_length, body_length = parse_head(stream)
+        meta = parse_meta(stream, meta_length) if meta_length > 0 else None
+        body = stream.read(body_length)
+        if meta is not None and meta.get(META_BODY_FORMAT) == BODY_FORMAT_BINARY_COLUMNS:
+            from pdr_python_sdk.spl.spl_binary_columns import decode_binary_columns
+            packets.append((meta, convert_body_to_str(decode_binary_columns(body).to_records())))
+        else:
+            packets.append((meta, body.decode('utf-8')))
+    return packets
+
+
+def _stable_meta(meta):
+    if meta is None:
+        return None
+    return {key: value for key, value in meta.items() if key not in VOLATILE_META_KEYS}
+
+
+def diff_packets(expected, actual, context=3, max_lines=50):
+    """
+    Compare two packet lists
+
+    :return: list of differences, one dict per differing packet
+    """
+    diffs = []
+    for i in range(max(len(expected), len(actual))):
+        if i >= len(expected) or i >= len(actual):
+            diffs.append({'packet': i, 'missing': 'expected' if i >= len(expected) else 'actual'})
+            continue
+        expected_meta, expected_body = expected[i]
+        actual_meta, actual_body = actual[i]
+        diff = {}
+        if _stable_meta(expected_meta) != _stable_meta(actual_meta):
+            diff['meta'] = {'expected': _stable_meta(expected_meta), 'actual': _stable_meta(actual_meta)}
+        if expected_body != actual_body:
+            lines = list(difflib.unified_diff(expected_body.split('\n'), actual_body.split('\n'),
+                                              'expected', 'actual', n=context, lineterm=''))
+            diff['body'] = lines[:max_lines]
+        if len(diff) > 0:
+            diff['packet'] = i
+            diffs.append(diff)
+    return diffs
+
+
+def replay(command, recorded_input, recorded_output=None, argv=None):
+    """
+    Run command, a SplBaseCommand, on a recorded input stream
+
+    recorded_input and recorded_output are the bytes of a recording. When
+    recorded_output is given the new output is compared with it packet by
+    packet.
+
+    :return: json serializable report with the timing, the command metrics and the differences
+    """
+    output = io.BytesIO()
+    start = time.perf_counter()
+    command.process_protocol([] if argv is None else argv, io.BytesIO(recorded_input), output)
+    elapsed = time.perf_counter() - start
+
+    packets = read_packets(output.getvalue())
+    report = {
+        'seconds': round(elapsed, 6),
+        'input_bytes': len(recorded_input),
+        'output_bytes': len(output.getvalue()),
+        'packets': len(packets),
+    }
+    metrics = getattr(command, 'metrics', None)
+    if metrics is not None:
+        report['metrics'] = metrics.summary()
+    if recorded_output is not None:
+        report['diffs'] = diff_packets(read_packets(recorded_output), packets)
+    return report
+
+
+def replay_file(command, path, argv=None):
+    """
+    Replay the recording at path, with or without its .in suffix
+    """
+    if path.endswith(RECORDING_INPUT_SUFFIX):
+        path = path[:-len(RECORDING_INPUT_SUFFIX)]
+    with open(path + RECORDING_INPUT_SUFFIX, 'rb') as f:
+        recorded_input = f.read()
+    recorded_output = None
+    if os.path.exists(path + RECORDING_OUTPUT_SUFFIX):
+        with open(path + RECORDING_OUTPUT_SUFFIX, 'rb') as f:
+            recorded_output = f.read()
+    return replay(command, recorded_input, recorded_output, argv)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="replay a recorded spl session against a command")
+    parser.add_argument("command", help="command class, as package.module:Class")
+    parser.add_argument("recording", help="recording path, with or without the .in suffix")
+    parser.add_argument("--path", action="append", default=[], help="add a directory to sys.path")
+    return parser.parse_args(argv)
+
+
+def replay_command(argv=None):
+    args = parse_args(argv)
+    for path in reversed(args.path):
+        sys.path.insert(0, path)
+    report = replay_file(load_class(args.command)(), args.recording)
+    sys.stdout.write(json.dumps(report, indent=2) + "\n")
+    if len(report.get('diffs', [])) > 0:
+        raise SystemExit(1)
+    return report
+
+
+if __name__ == "__main__":
+    replay_command()
@@ -16,6 +16,9 @@ setup(
         'console_scripts': [
             'upload_app=pdr_python_sdk.tools.upload:upload',
             'create_pandora_app=pdr_python_sdk.tools.create:create_pandora_app',
+            'spl_benchmark=pdr_python_sdk.tools.spl_benchmark:benchmark',
+            'spl_replay=pdr_python_sdk.tools.spl_replay:replay_command',
+            'pdr_fork_server=pdr_python_sdk.fork_server:main',
         ],
     },
 
@@ -0,0 +1,92 @@
+"""
+Packet builders, readers and commands shared by the spl tests
+"""
+
+import io
+import json
+
+from pdr_python_sdk.spl import *
+
+
+def packet(meta, body=b""):
+    meta = json.dumps(meta).encode("utf-8")
+    return "chunked 1.0,{},{}\n".format(len(meta), len(body)).encode("utf-8") + meta + body
+
+
+def request(*bodies, **getinfo):
+    """
+    Bytes of a getinfo packet followed by one execute packet per body
+
+    A body given as a list of records is sent as binary columns.
+    """
+    data = packet(dict({"action": "getinfo", "searchinfo": {"args": []}}, **getinfo))
+    for i, body in enumerate(bodies):
+        meta = {"action": "execute", "finished": i == len(bodies) - 1}
+        if isinstance(body, list):
+            from pdr_python_sdk.spl.spl_binary_columns import encode_binary_columns
+            meta[META_BODY_FORMAT] = BODY_FORMAT_BINARY_COLUMNS
+            body = encode_binary_columns(body)
+        data += packet(meta, body)
+    return data
+
+
+def session(*bodies, **getinfo):
+    return io.BytesIO(request(*bodies, **getinfo))
+
+
+def read_packets(data, text=True):
+    """
+    Read the packets written by a command, bodies as text unless text is False
+    """
+    if not isinstance(data, bytes):
+        data = data.getvalue()
+    stream = io.BytesIO(data)
+    packets = []
+    while stream.tell() < len(data):
+        meta_length, body_length = parse_head(stream)
+        meta = parse_meta(stream, meta_length)
+        body = stream.read(body_length)
+        packets.append((meta, body.decode("utf-8") if text else body))
+    return packets
+
+
+def run_command(command, *bodies, text=True, **getinfo):
+    output = io.BytesIO()
+    command.process_protocol([], session(*bodies, **getinfo), output)
+    return read_packets(output, text)
+
+
+def typed_body(lines):
+    """
+    Text body of records with typed input cells, every value being an int or a str
+    """
+    rows = convert_body_to_str(lines).split("\n")
+    cells = [rows[0]] + ["\t".join(("1," if cell.isdigit() else "0,") + cell for cell in row.split("\t"))
+                         for row in rows[1:]]
+    return "\n".join(cells).encode("utf-8")
+
+
+def body_records(body):
+    """
+    Records of an output text body, every value a str
+    """
+    if len(body) == 0:
+        return []
+    rows = body.split("\n")
+    fields = rows[0].split("\t")
+    return [dict(zip(fields, row.split("\t"))) for row in rows[1:]]
+
+
+class RequireA(SplStreamingBatchCommand):
+    """
+    Requires field a, adds twice = a * 2 and keeps the types of field b it saw
+    """
+
+    def config_require_fields(self, require_fields=None):
+        return ["a"]
+
+    def streaming_handle(self, lines):
+        self.types = [type(line["b"]) for line in lines if "b" in line]
+        for line in lines:
+            line["twice"] = line["a"] * 2
+        return lines
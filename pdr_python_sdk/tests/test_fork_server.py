@@ -0,0 +1,107 @@
+import unittest
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from pdr_python_sdk.spl import *
+from tests.spl_helpers import request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORK_SERVER = os.path.join(ROOT, "pdr_python_sdk", "fork_server.py")
+
+
+class Upper(SplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        for line in lines:
+            line["a"] = line["a"].upper()
+            line["pid"] = os.getpid()
+        return lines
+
+
+class Stall(SplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        with open(os.path.join(os.environ["STALL_DIR"], "pid"), "w") as pid_file:
+            pid_file.write(str(os.getpid()))
+        time.sleep(60)
+        return lines
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def exited(pid):
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+
+def start_server(command, socket_path):
+    server = subprocess.Popen([sys.executable, "-m", "pdr_python_sdk.fork_server", "serve", command, socket_path],
+                              cwd=ROOT)
+    wait_for(lambda: os.path.exists(socket_path))
+    return server
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX") and hasattr(os, "fork"), "needs Unix sockets and fork")
+class TestForkServerMethods(unittest.TestCase):
+
+    def test_launch(self):
+        data = request(b"a\n0,x\n0,y")
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "app.sock")
+            server = start_server("tests.test_fork_server:Upper", socket_path)
+            try:
+                pids = set()
+                # by module and by path, which imports nothing but the standard library
+                for launcher in ([sys.executable, "-m", "pdr_python_sdk.fork_server"], [sys.executable, FORK_SERVER]):
+                    result = subprocess.run(launcher + ["launch", socket_path, tmp, tmp], cwd=ROOT, input=data,
+                                            stdout=subprocess.PIPE, timeout=30)
+                    self.assertEqual(result.returncode, 0)
+                    body = result.stdout.split(b"\n", 2)[2]
+                    rows = body.decode("utf-8").split("\n")
+                    self.assertTrue(rows[0].endswith("a\tpid"))
+                    self.assertEqual([row.split("\t")[0] for row in rows[1:]], ["X", "Y"])
+                    pids.add(rows[1].split("\t")[1])
+                self.assertEqual(len(pids), 2)
+                self.assertNotIn(str(server.pid), pids)
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+            self.assertFalse(os.path.exists(socket_path))
+
+    @unittest.skipUnless(os.path.isdir("/proc"), "needs /proc")
+    def test_worker_exits_with_launcher(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            socket_path = os.path.join(tmp, "app.sock")
+            server = start_server("tests.test_fork_server:Stall", socket_path)
+            try:
+                launcher = subprocess.Popen([sys.executable, FORK_SERVER, "launch", socket_path, tmp, tmp], cwd=ROOT,
+                                            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                            env=dict(os.environ, STALL_DIR=tmp))
+                launcher.stdin.write(request(b"a\n0,x"))
+                launcher.stdin.flush()
+                pid_path = os.path.join(tmp, "pid")
+                self.assertTrue(wait_for(lambda: os.path.exists(pid_path) and os.path.getsize(pid_path) > 0))
+                with open(pid_path) as pid_file:
+                    worker = int(pid_file.read())
+                launcher.kill()
+                launcher.wait(timeout=10)
+                self.assertTrue(wait_for(lambda: exited(worker)))
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
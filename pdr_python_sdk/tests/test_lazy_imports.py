@@ -0,0 +1,67 @@
+import unittest
+import __future__
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+import pdr_python_sdk
+
+
+def loaded_modules(code):
+    script = code + "\nimport sys\nprint(' '.join(sorted(m for m in ('pandas', 'numpy', 'urllib3', 'multiprocessing') if m in sys.modules)))"
+    return subprocess.check_output([sys.executable, "-c", script]).decode("utf-8").split()
+
+
+class TestLazyImportMethods(unittest.TestCase):
+
+    def test_spl_command_skips_heavy_dependencies(self):
+        self.assertEqual(loaded_modules("from pdr_python_sdk.spl import *\n"
+                                        "from pdr_python_sdk.on_demand_action import run"), [])
+
+    def test_lazy_attributes(self):
+        self.assertEqual(loaded_modules("import pdr_python_sdk\npdr_python_sdk.connect"), ["urllib3"])
+        self.assertIn("pandas", loaded_modules("from pdr_python_sdk import SearchManager"))
+        self.assertIn("numpy", loaded_modules("from pdr_python_sdk.spl import parse_body_columns"))
+
+    def test_star_import_binds_lazy_members(self):
+        namespace = {}
+        exec("from pdr_python_sdk import *", namespace)
+        for name in ("client", "storage", "manager", "schedule", "connect", "PATH_REPOS", "StorageLookup",
+                     "SearchManager", "spl"):
+            self.assertIn(name, namespace)
+        self.assertEqual(namespace["connect"].__module__, "pdr_python_sdk.client")
+
+    def test_lazy_attrs_match_submodules(self):
+        expected = {}
+        for submodule in pdr_python_sdk._LAZY_SUBMODULES:
+            module = importlib.import_module("pdr_python_sdk." + submodule)
+            names = getattr(module, "__all__", None) or [
+                name for name, value in vars(module).items()
+                if not name.startswith("_") and not isinstance(value, (type(sys), __future__._Feature))]
+            for name in names:
+                if name not in pdr_python_sdk._EAGER_NAMES and name not in pdr_python_sdk._LAZY_SUBMODULES:
+                    expected[name] = submodule
+        self.assertEqual(pdr_python_sdk._LAZY_ATTRS, expected)
+
+    def test_import_from_zip(self):
+        root = os.path.dirname(os.path.dirname(pdr_python_sdk.__file__))
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, "pdr_python_sdk.zip")
+            with zipfile.ZipFile(archive, "w") as zipped:
+                for directory, _, files in os.walk(os.path.dirname(pdr_python_sdk.__file__)):
+                    for name in files:
+                        if name.endswith(".py"):
+                            path = os.path.join(directory, name)
+                            zipped.write(path, os.path.relpath(path, root))
+            script = ("import sys\nsys.path.insert(0, {!r})\nimport pdr_python_sdk\n"
+                      "assert pdr_python_sdk.__file__.startswith({!r})\n"
+                      "print(pdr_python_sdk.StorageLookup.__module__)").format(archive, archive)
+            output = subprocess.check_output([sys.executable, "-c", script], cwd=tmp)
+        self.assertEqual(output.decode("utf-8").strip(), "pdr_python_sdk.storage.lookup")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import asyncio
+import io
+import os
+import threading
+import time
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.spl.spl_async_command import *
+from tests.spl_helpers import *
+
+
+class SlowLookup(AsyncSplStreamingBatchCommand):
+    def __init__(self):
+        super(SlowLookup, self).__init__()
+        self.concurrency = 50
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def row_handle(self, line):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if line["a"] % 3 == 0:
+            return None
+        line["b"] = line["a"] * 2
+        return line
+
+
+class BlockingLookup(AsyncSplStreamingBatchCommand):
+    def __init__(self):
+        super(BlockingLookup, self).__init__()
+        self.concurrency = 10
+
+    async def row_handle(self, line):
+        line["b"] = await self.run_blocking(self.lookup, line["a"])
+        return line
+
+    def lookup(self, value):
+        time.sleep(0.02)
+        return value + 1
+
+
+class SyncHandle(AsyncSplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        return [{"n": len(lines)}]
+
+
+class TestAsyncCommandMethods(unittest.TestCase):
+
+    def test_rows_in_flight(self):
+        body = ("a\n" + "\n".join("1,{}".format(i) for i in range(100))).encode("utf-8")
+        command = SlowLookup()
+        start = time.perf_counter()
+        responses = run_command(command, body, body)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(len(responses), 3)
+        rows = responses[1][1].split("\n")
+        self.assertEqual(rows[0], "a\tb")
+        self.assertEqual(rows[1:3], ["1\t2", "2\t4"])
+        self.assertEqual(len(rows), 1 + 66)
+        self.assertEqual(command.max_in_flight, 50)
+        # 200 rows of 10ms each, 50 at a time
+        self.assertLess(elapsed, 1.0)
+        self.assertTrue(responses[2][0]["finished"])
+
+    def test_run_blocking(self):
+        body = ("a\n" + "\n".join("1,{}".format(i) for i in range(20))).encode("utf-8")
+        command = BlockingLookup()
+        start = time.perf_counter()
+        packets = run_command(command, body)
+        self.assertLess(time.perf_counter() - start, 0.3)
+        rows = packets[1][1].split("\n")
+        self.assertEqual(rows[1:], ["{}\t{}".format(i, i + 1) for i in range(20)])
+        self.assertIsNone(command.executor)
+
+    def test_delta_output_of_dropped_rows(self):
+        class UpperOrDrop(AsyncSplStreamingBatchCommand):
+            def __init__(self):
+                super(UpperOrDrop, self).__init__()
+                self.delta_output = True
+
+            def config_export_fields(self, export_fields=None):
+                return ["a"]
+
+            async def row_handle(self, line):
+                return None if line["a"] == "skip" else {"a": line["a"].upper()}
+
+        body = b"a\n0,skip\n0,x\n0,y"
+        packets = run_command(UpperOrDrop(), body, capabilities=[CAPABILITY_DELTA_OUTPUT])
+        self.assertEqual(packets[1][1], "_row\ta\n1\tX\n2\tY")
+        self.assertEqual(run_command(UpperOrDrop(), body)[1][1], "a\nskip\nX\nY")
+
+    def test_sync_handle_and_errors(self):
+        packets = run_command(SyncHandle(), b"a\n1,1\n1,2", b"a\n1,3")
+        self.assertEqual([body for _, body in packets], ["", "n\n2", "n\n1"])
+
+        output = io.BytesIO()
+        SyncHandle().process_protocol([], io.BytesIO(request(b"a\n1,1")[:-3]), output)
+        responses = read_packets(output.getvalue())
+        self.assertIn("Unexpected end of stream", responses[-1][0]["error_message"])
+
+    def test_pipes(self):
+        in_read, in_write = os.pipe()
+        out_read, out_write = os.pipe()
+        body = ("a\n" + "\n".join("1,{}".format(i) for i in range(30000))).encode("utf-8")
+        data = request(body, b"a\n1,5")
+        received = []
+
+        def feed():
+            with os.fdopen(in_write, "wb") as f:
+                f.write(data)
+
+        def drain():
+            with os.fdopen(out_read, "rb") as f:
+                received.append(f.read())
+
+        threads = [threading.Thread(target=feed), threading.Thread(target=drain)]
+        for thread in threads:
+            thread.start()
+        input_stream = os.fdopen(in_read, "rb")
+        output_stream = os.fdopen(out_write, "wb")
+        command = SlowLookup()
+        command.row_handle = AsyncSplStreamingBatchCommand.row_handle.__get__(command)
+        command.process_protocol([], input_stream, output_stream)
+        self.assertTrue(os.get_blocking(output_stream.fileno()))
+        input_stream.close()
+        output_stream.close()
+        for thread in threads:
+            thread.join()
+
+        responses = read_packets(received[0])
+        self.assertEqual([meta.get("finished") for meta, _ in responses], [None, False, True])
+        self.assertEqual(responses[1][1], body.decode("utf-8").replace("1,", ""))
+        self.assertEqual(responses[2][1], "a\n5")
+
+
+if __name__ == '__main__':
+    unittest.main()
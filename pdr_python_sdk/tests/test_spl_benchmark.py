@@ -0,0 +1,24 @@
+import unittest
+import io
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.tools.spl_benchmark import generate_chunk, run_benchmark
+
+
+class TestBenchmarkMethods(unittest.TestCase):
+
+    def test_generate_chunk(self):
+        body, records = generate_chunk(rows=50, columns=5, type_mix=("string", "int", "float", "boolean", "null"),
+                                       escape_density=0.5)
+        self.assertEqual(parse_body(io.BytesIO(body), len(body)), records)
+        self.assertEqual(len(records), 50)
+
+    def test_run_benchmark(self):
+        report = run_benchmark(rows=20, columns=3, repeat=1)
+        self.assertEqual(report["params"]["rows"], 20)
+        self.assertIn("parse_body", report["results"])
+        self.assertGreater(report["results"]["convert_body_to_str"]["seconds"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
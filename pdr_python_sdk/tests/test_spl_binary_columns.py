@@ -0,0 +1,82 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.spl.spl_binary_columns import *
+from tests.spl_helpers import *
+
+
+class TestBinaryColumnsMethods(unittest.TestCase):
+
+    def test_round_trip(self):
+        lines = [{"a": 1, "b": "x\ty", "c": 1.5, "d": True},
+                 {"a": 2, "c": 2, "d": False, "e": None},
+                 {"a": 3, "b": "é\\n", "c": None, "d": True}]
+        columns = decode_binary_columns(encode_binary_columns(lines))
+        self.assertEqual(columns.fields, ["a", "b", "c", "d", "e"])
+        self.assertEqual(columns.types, {"a": TYPE_INT, "b": TYPE_STRING, "c": TYPE_FLOAT, "d": TYPE_BOOLEAN,
+                                         "e": TYPE_NULL})
+        self.assertEqual(columns["a"].dtype, np.int64)
+        self.assertFalse(columns["a"].flags.writeable)
+        self.assertEqual(columns["b"].tolist(), ["x\ty", "", "é\\n"])
+        self.assertEqual(columns.null_masks["c"].tolist(), [False, False, True])
+        self.assertEqual(columns.to_records()[2], {"a": 3, "b": "é\\n", "c": "", "d": True, "e": ""})
+
+    def test_encode_dataframe(self):
+        df = pd.DataFrame({"x": np.arange(3), "y": [0.5, np.nan, 1.0], "z": ["a", "b", "c"]})
+        columns = decode_binary_columns(encode_binary_columns(df), projection={"x"}, keep_unrequested=False)
+        self.assertEqual(columns.fields, ["x"])
+        self.assertEqual(columns["x"].tolist(), [0, 1, 2])
+        self.assertEqual(encode_binary_columns([]), b"")
+
+    def test_encode_nullable_dataframe(self):
+        df = pd.DataFrame({"i": pd.array([1, None, 3], dtype="Int64"),
+                           "f": pd.array([0.5, None, 1.5], dtype="Float64"),
+                           "b": pd.array([True, None, False], dtype="boolean"),
+                           "n": pd.array([1, 2, 3], dtype="Int64")})
+        columns = decode_binary_columns(encode_binary_columns(df))
+        self.assertEqual(columns.types, {"i": TYPE_INT, "f": TYPE_FLOAT, "b": TYPE_BOOLEAN, "n": TYPE_INT})
+        self.assertEqual(columns.null_masks["i"].tolist(), [False, True, False])
+        self.assertEqual(columns.null_masks["b"].tolist(), [False, True, False])
+        self.assertEqual(columns.to_records()[1], {"i": "", "f": "", "b": "", "n": 2})
+        self.assertEqual(columns["i"][[0, 2]].tolist(), [1, 3])
+
+    def test_negotiated_command(self):
+        command = RequireA()
+        command.binary_body = True
+        packets = run_command(command, [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}], text=False,
+                              capabilities=[CAPABILITY_BINARY_COLUMNS])
+        self.assertEqual(packets[0][0][META_BODY_FORMAT], BODY_FORMAT_BINARY_COLUMNS)
+        self.assertEqual(packets[1][0][META_BODY_FORMAT], BODY_FORMAT_BINARY_COLUMNS)
+        columns = decode_binary_columns(packets[1][1])
+        self.assertEqual(columns["twice"].tolist(), [2, 4])
+        self.assertEqual(columns["b"].tolist(), ["x", "y"])
+
+    def test_negotiated_rows_and_compact(self):
+        class RowTypes(RequireA):
+            def streaming_handle(self, lines):
+                self.row_types = {type(line) for line in lines}
+                return super(RowTypes, self).streaming_handle(lines)
+
+        command = RowTypes()
+        command.binary_body = True
+        command.compact_rows = True
+        packets = run_command(command, [{"a": 1, "b": "x"}, {"a": 2, "b": "y"}, {"a": 3, "b": "z"}], text=False,
+                              capabilities=[CAPABILITY_BINARY_COLUMNS])
+        self.assertEqual(command.row_types, {SplRow})
+        self.assertEqual(decode_binary_columns(packets[1][1])["twice"].tolist(), [2, 4, 6])
+        self.assertEqual(binary_columns_rows(packets[1][1]), 3)
+        self.assertEqual(command.metrics.summary()["rows_out"], 3)
+
+    def test_text_fallback(self):
+        command = RequireA()
+        command.binary_body = True
+        packets = run_command(command, b"a\n1,4")
+        self.assertEqual(packets[1][1], "a\ttwice\n4\t8")
+        self.assertFalse(command.binary_negotiated)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import io
+import os
+
+from pdr_python_sdk.spl import *
+from tests.spl_helpers import packet
+
+
+class TrickleStream(io.RawIOBase):
+    """
+    Raw stream returning at most three bytes per read
+    """
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.data.read(min(3, len(buffer)))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class TestChannelMethods(unittest.TestCase):
+
+    def test_read_packet(self):
+        body = b"a\tb\n0,abc\t1,3\n0,def\t1,4"
+        data = packet({"action": "getinfo"}) + packet({"action": "execute"}, body)
+        for stream in (io.BytesIO(data), TrickleStream(data)):
+            channel = SplChannel(stream, io.BytesIO(), buffer_size=8)
+            meta, body_view = channel.read_packet()
+            self.assertEqual(meta, {"action": "getinfo"})
+            self.assertEqual(len(body_view), 0)
+            meta, body_view = channel.read_packet()
+            self.assertEqual(meta["action"], "execute")
+            self.assertEqual(bytes(body_view), body)
+            self.assertEqual(list(channel.iter_body()), [{"a": "abc", "b": 3}, {"a": "def", "b": 4}])
+
+    def test_write_packet(self):
+        lines = [{"a": 1, "b": "ABC"}]
+        expected = io.BytesIO()
+        send_packet(expected, {"action": "execute"}, lines)
+
+        stream = io.BytesIO()
+        SplChannel(io.BytesIO(), stream).write_packet({"action": "execute"}, lines)
+        self.assertEqual(stream.getvalue(), expected.getvalue())
+
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(write_fd, "wb") as output, os.fdopen(read_fd, "rb") as pipe:
+            SplChannel(io.BytesIO(), output).write_packet({"action": "execute"}, lines)
+            output.close()
+            self.assertEqual(pipe.read(), expected.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import io
+
+import numpy as np
+import pandas as pd
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.spl.spl_columnar_utils import *
+
+
+class TestColumnarMethods(unittest.TestCase):
+
+    def test_parse_body_columns(self):
+        body = b"a\tb\tc\td\n0,abc\t1,3\t2,4.5\t4,true\n0,a\\tb\t3,\t2,4.6\t4,False"
+        columns = parse_body_columns(io.BytesIO(body), len(body))
+        self.assertEqual(len(columns), 2)
+        self.assertEqual(columns.fields, ["a", "b", "c", "d"])
+        self.assertEqual(columns["a"].tolist(), ["abc", "a\tb"])
+        self.assertEqual(columns["b"].dtype, np.int64)
+        self.assertEqual(columns["b"][0], 3)
+        self.assertEqual(columns.null_masks["b"].tolist(), [False, True])
+        self.assertEqual(columns.types["b"], TYPE_INT)
+        self.assertEqual(columns["c"].dtype, np.float64)
+        self.assertAlmostEqual(columns["c"][1], 4.6)
+        self.assertEqual(columns["d"].tolist(), [True, False])
+
+    def test_decode_column_mixed_types(self):
+        values, null_mask, column_type = decode_column(("1,1", "2,2.5", "3,"))
+        self.assertEqual(values.dtype, np.float64)
+        self.assertEqual(values[0], 1.0)
+        self.assertTrue(np.isnan(values[2]))
+        self.assertEqual(null_mask.tolist(), [False, False, True])
+        self.assertEqual(column_type, TYPE_FLOAT)
+
+        values, null_mask, column_type = decode_column(("0,x", "1,7", "5,[1,2]"))
+        self.assertEqual(values.tolist(), ["x", 7, "[1,2]"])
+        self.assertIsNone(column_type)
+
+        values, null_mask, column_type = decode_column(("1,99999999999999999999", "3,", "1,2"))
+        self.assertEqual(values[[0, 2]].tolist(), [99999999999999999999, 2])
+        self.assertEqual(null_mask.tolist(), [False, True, False])
+        self.assertEqual(column_type, TYPE_INT)
+        body = b"a\n1,99999999999999999999\n3,"
+        self.assertEqual(parse_body_columns(io.BytesIO(body), len(body)).to_records(),
+                         parse_body(io.BytesIO(body), len(body)))
+
+    def test_ragged_rows_are_null(self):
+        columns = decode_body_columns("a\tb\n1,1\t1,2\n1,3")
+        self.assertEqual(columns.null_masks["b"].tolist(), [False, True])
+        self.assertEqual(columns.to_records(), [{"a": 1, "b": 2}, {"a": 3, "b": ""}])
+
+    def test_to_records_matches_parse_body(self):
+        body = b"a\tb\tc\n0,abc\t1,3\t2,4.5\n0,abcd\t3,\t4,true"
+        expected = parse_body(io.BytesIO(body), len(body))
+        columns = parse_body_columns(io.BytesIO(body), len(body))
+        self.assertEqual(columns.to_records(), expected)
+
+    def test_decode_body_columns_projection(self):
+        body = "a\tb\n1,1\t0,x\\ty\n1,2\t3,"
+        columns = decode_body_columns(body, projection={"a"})
+        self.assertEqual(columns["a"].dtype, np.int64)
+        self.assertEqual(columns["b"].tolist(), ["x\\ty", ""])
+        self.assertIsNone(columns.types["b"])
+        self.assertEqual(convert_columns_to_str(columns.columns), "a\tb\n1\tx\\ty\n2\t")
+
+        columns = decode_body_columns(body, projection={"a"}, keep_unrequested=False)
+        self.assertEqual(columns.fields, ["a"])
+
+    def test_convert_dataframe_to_str(self):
+        df = pd.DataFrame({"a": [1, 2], "b": ["x\ty", "z"], "c": [0.5, np.nan], "d": [True, False]})
+        expected = convert_body_to_str(df.to_dict("records"))
+        self.assertEqual(convert_body_to_str(df), expected)
+        self.assertEqual(expected, "a\tb\tc\td\n1\tx\\ty\t0.5\tTrue\n2\tz\tnan\tFalse")
+
+    def test_convert_columns_to_str(self):
+        columns = {"a": np.array([1, 2]), "b": ["x", "y\n"], "c": [SplRawValue("p\\tq"), "r\t"]}
+        self.assertEqual(convert_body_to_str(columns), "a\tb\tc\n1\tx\tp\\tq\n2\ty\\n\tr\\t")
+        self.assertEqual(convert_body_to_str(pd.DataFrame({"a": []})), "")
+        with self.assertRaises(RuntimeError):
+            convert_columns_to_str({"a": [1], "b": [1, 2]})
+
+    def test_send_dataframe(self):
+        stream = io.BytesIO()
+        send_packet(output_stream=stream, meta_info={}, lines=pd.DataFrame({"a": [1]}))
+        self.assertEqual(stream.getvalue(), b"chunked 1.0,2,3\n{}a\n1")
+
+
+if __name__ == "__main__":
+    unittest.main()
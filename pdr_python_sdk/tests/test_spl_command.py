@@ -0,0 +1,271 @@
+import unittest
+import io
+import os
+import threading
+
+from pdr_python_sdk.spl import *
+from tests.spl_helpers import *
+
+
+class FooBatch(SplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        for line in lines:
+            line["foo"] = "bar"
+        return lines
+
+
+class PidBatch(SplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        return [{"n": line["n"], "pid": os.getpid()} for line in lines]
+
+
+class FooChunk(SplStreamingChunkCommand):
+    def streaming_handle(self, lines):
+        return [{"count": len(lines)}]
+
+
+class CountChunk(SplStreamingChunkCommand):
+    def streaming_handle(self, lines):
+        self.received = lines
+        return ({"a": line["a"], "twice": line["b"] * 2} for line in lines)
+
+
+class Enrich(SplStreamingBatchCommand):
+    def __init__(self):
+        super(Enrich, self).__init__()
+        self.delta_output = True
+
+    def config_export_fields(self, export_fields=None):
+        return ["len"]
+
+    def streaming_handle(self, lines):
+        return [{"_row": i, "len": len(line["a"])} for i, line in enumerate(lines) if line["a"] != "skip"]
+
+
+class CountByKey(SplReducingCommand):
+    def reduce(self, state, lines):
+        self.max_lines = max(getattr(self, "max_lines", 0), len(lines))
+        for line in lines:
+            state[line["a"]] = state.get(line["a"], 0) + 1
+        return state
+
+    def finalize(self, state):
+        return [{"a": key, "count": count} for key, count in sorted(state.items())]
+
+
+class CountGenerating(SplGeneratingCommand):
+    def generate(self):
+        for i in range(5):
+            yield {"n": i}
+        yield [{"n": i} for i in range(5, 10)]
+
+
+class TestCommandMethods(unittest.TestCase):
+
+    def test_streaming_batch_command(self):
+        packets = run_command(FooBatch(), b"a\tb\n0,x\t1,1\n0,y\t1,2", b"a\n0,z")
+        self.assertEqual(len(packets), 3)
+        self.assertEqual(packets[0][0]["require_fields"], ["*"])
+        self.assertEqual(packets[1][1], "a\tb\tfoo\nx\t1\tbar\ny\t2\tbar")
+        self.assertTrue(packets[2][0]["finished"])
+        self.assertEqual(packets[2][1], "a\tfoo\nz\tbar")
+
+    def test_require_fields_projection(self):
+        command = RequireA()
+        packets = run_command(command, b"a\tb\n0,x\t1,1\n0,y\t1,2")
+        self.assertEqual(packets[0][0]["require_fields"], ["a"])
+        self.assertEqual(packets[1][1], "a\tb\ttwice\nx\t1\txx\ny\t2\tyy")
+        self.assertEqual(command.types, [int, int])
+
+        command = RequireA()
+        command.project_require_fields = True
+        self.assertEqual(run_command(command, b"a\tb\n0,x\t1,1\n0,y\t1,2"), packets)
+        self.assertEqual(command.types, [SplRawValue, SplRawValue])
+
+        command = RequireA()
+        command.project_require_fields = True
+        command.keep_unrequested_fields = False
+        self.assertEqual(run_command(command, b"a\tb\n0,x\t1,1")[1][1], "a\ttwice\nx\txx")
+
+    def test_backslash_pass_through(self):
+        class Untouched(SplStreamingBatchCommand):
+            def streaming_handle(self, lines):
+                self.paths = [line["path"] for line in lines]
+                return lines
+
+        command = Untouched()
+        packets = run_command(command, b"path\n0,C:\\dir\\file\n0,C:\\new")
+        self.assertEqual(packets[1][1], "path\nC:\\dir\\file\nC:\\new")
+        self.assertNotIn(META_STRING_ESCAPES, packets[0][0])
+
+        command = Untouched()
+        packets = run_command(command, b"path\n0,C:\\\\dir\\tx\n0,C:\\\\new",
+                              capabilities=[CAPABILITY_BACKSLASH_ESCAPES])
+        self.assertEqual(packets[0][0][META_STRING_ESCAPES], CAPABILITY_BACKSLASH_ESCAPES)
+        self.assertEqual(command.paths, ["C:\\dir\tx", "C:\\new"])
+        self.assertEqual(packets[1][1], "path\nC:\\\\dir\\tx\nC:\\\\new")
+        self.assertEqual(run_command(Untouched(), b"path\n0,C:\\dir")[1][1], "path\nC:\\dir")
+
+    def test_delta_output(self):
+        body = b"a\tb\n0,xx\t1,1\n0,skip\t1,2\n0,yyy\t1,3"
+        packets = run_command(Enrich(), body)
+        self.assertNotIn("output_mode", packets[0][0])
+        self.assertEqual(packets[1][1], "a\tb\tlen\nxx\t1\t2\nskip\t2\t\nyyy\t3\t3")
+
+        packets = run_command(Enrich(), body, capabilities=[CAPABILITY_DELTA_OUTPUT])
+        self.assertEqual(packets[0][0]["output_mode"], CAPABILITY_DELTA_OUTPUT)
+        self.assertEqual(packets[1][1], "_row\tlen\n0\t2\n2\t3")
+
+    def test_delta_output_of_columns(self):
+        class Lengths(SplStreamingBatchCommand):
+            def streaming_handle(self, lines):
+                return {"a": [line["a"] for line in lines], "len": [len(line["a"]) for line in lines]}
+
+        command = Lengths()
+        command.delta_output = True
+        packets = run_command(command, b"a\n0,xx\n0,y", capabilities=[CAPABILITY_DELTA_OUTPUT])
+        self.assertEqual(packets[1][1], "_row\ta\tlen\n0\txx\t2\n1\ty\t1")
+
+    def test_pipelined_batch_command(self):
+        bodies = [b"a\n0,x%d\n0,y" % i for i in range(20)]
+        expected = run_command(FooBatch(), *bodies)
+        command = FooBatch()
+        command.pipelined = True
+        self.assertEqual(run_command(command, *bodies), expected)
+
+    def test_worker_processes(self):
+        body = b"n\n" + b"\n".join(b"1,%d" % i for i in range(100))
+        command = PidBatch()
+        command.worker_processes = 2
+        command.min_rows_per_worker = 10
+        packets = run_command(command, body, body)
+        rows = [row.split("\t") for row in packets[1][1].split("\n")[1:]]
+        self.assertEqual([row[0] for row in rows], [str(i) for i in range(100)])
+        self.assertNotIn(str(os.getpid()), set(row[1] for row in rows))
+        self.assertIsNone(command.worker_pool)
+
+        command = PidBatch()
+        command.worker_processes = 2
+        command.min_rows_per_worker = 10
+        command.pipelined = True
+        pipelined = run_command(command, body, body)
+        self.assertEqual([row.split("\t")[0] for row in pipelined[2][1].split("\n")[1:]], [row[0] for row in rows])
+
+    def test_no_fork_while_pipeline_threads_run(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=stop.wait)
+        thread.start()
+        command = PidBatch()
+        command.worker_processes = 2
+        command.pipeline_threads = [thread]
+        try:
+            with self.assertRaises(RuntimeError):
+                command.get_worker_pool()
+        finally:
+            stop.set()
+            thread.join()
+        self.assertIsNone(command.worker_pool)
+
+    def test_delta_output_in_worker_processes(self):
+        body = b"a\n" + b"\n".join(b"0,%s" % (b"x" * (i % 7) if i % 5 else b"skip") for i in range(100))
+        expected = run_command(Enrich(), body)
+        expected_delta = run_command(Enrich(), body, capabilities=[CAPABILITY_DELTA_OUTPUT])
+        for capabilities, packets in (([], expected), ([CAPABILITY_DELTA_OUTPUT], expected_delta)):
+            command = Enrich()
+            command.worker_processes = 2
+            command.min_rows_per_worker = 10
+            self.assertEqual(run_command(command, body, capabilities=capabilities)[1:], packets[1:])
+        self.assertIn("\n6\t6\n", expected_delta[1][1])
+
+    def test_streaming_chunk_command(self):
+        packets = run_command(FooChunk(), b"a\n0,x\n0,y", b"a\n0,z")
+        self.assertEqual(packets[1][1], "")
+        self.assertEqual(packets[2][1], "count\n3")
+
+    def test_reducing_command(self):
+        command = CountByKey()
+        packets = run_command(command, b"a\n0,x\n0,y", b"a\n0,x", b"a\n0,z")
+        self.assertEqual([body for _, body in packets[1:3]], ["", ""])
+        self.assertEqual(packets[3][1], "a\tcount\nx\t2\ny\t1\nz\t1")
+        self.assertEqual(command.max_lines, 2)
+        self.assertEqual(command.lines, [])
+
+    def test_generating_command_chunks_generator(self):
+        command = CountGenerating()
+        command.max_packet_rows = 4
+        packets = run_command(command, b"", b"", b"", b"")
+        self.assertEqual([body.count("\n") for _, body in packets[1:]], [4, 4, 2, 0])
+        self.assertEqual(packets[3][1], "n\n8\n9")
+
+        command = CountGenerating()
+        command.max_packet_rows = 4
+        packets = run_command(command, b"", b"")
+        self.assertEqual([body.count("\n") for _, body in packets[1:]], [4, 6])
+
+        command = CountGenerating()
+        command.max_packet_rows = 4
+        finishing = packet({"action": "execute", "finished": True})
+        data = packet({"action": "getinfo", "searchinfo": {"args": []},
+                       "capabilities": [CAPABILITY_UNFINISHED_RESPONSE]}) + finishing * 3
+        output = io.BytesIO()
+        command.process_protocol([], io.BytesIO(data), output)
+        packets = read_packets(output)
+        self.assertEqual([body.count("\n") for _, body in packets[1:]], [4, 4, 2])
+        self.assertEqual([meta["finished"] for meta, _ in packets[1:]], [False, False, True])
+
+
+class TestSpillMethods(unittest.TestCase):
+
+    def test_spilled_lines(self):
+        lines = SplSpilledLines([{"a": 1}])
+        lines.spill()
+        lines.extend([{"a": 2}, {"a": 3}])
+        lines.spill()
+        lines.append({"a": 4})
+        self.assertEqual(len(lines), 4)
+        self.assertEqual([line["a"] for line in lines], [1, 2, 3, 4])
+        self.assertEqual([line["a"] for line in lines], [1, 2, 3, 4])
+        self.assertEqual([lines[i]["a"] for i in (2, 0, 1, 3, -1)], [3, 1, 2, 4, 4])
+        self.assertEqual([line["a"] for line in lines[1:3]], [2, 3])
+        self.assertEqual([line["a"] for line in lines], [1, 2, 3, 4])
+        with self.assertRaises(IndexError):
+            lines[4]
+        lines.close()
+
+    def test_chunk_command_spills(self):
+        bodies = [b"a\tb\n0,x%d\t1,%d" % (i, i) for i in range(10)]
+        expected = run_command(CountChunk(), *bodies)
+        command = CountChunk()
+        command.memory_budget = 30
+        self.assertEqual(run_command(command, *bodies), expected)
+        self.assertIsInstance(command.received, SplSpilledLines)
+        self.assertIsNone(command.received.file)
+
+
+class TestMetricsMethods(unittest.TestCase):
+
+    def test_metrics_summary(self):
+        command = FooBatch()
+        command.metrics_in_meta = True
+        packets = run_command(command, b"a\tb\n0,x\t1,1\n0,y\t1,2", b"a\n0,z")
+        self.assertNotIn(META_METRICS, packets[1][0])
+        metrics = packets[2][0][META_METRICS]
+        self.assertEqual(metrics["chunks"], 2)
+        self.assertEqual(metrics["rows_in"], 3)
+        self.assertEqual(set(metrics["seconds"]), set(PHASES))
+        self.assertNotIn("per_chunk", metrics)
+        self.assertEqual(command.metrics.summary()["rows_out"], 3)
+
+    def test_metrics_per_chunk(self):
+        command = FooChunk()
+        command.metrics_debug = True
+        run_command(command, b"a\n0,x", b"a\n0,y", b"a\n0,z")
+        chunks = command.metrics.summary()["per_chunk"]
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(set(chunks[0]), {PHASE_READ, PHASE_ENCODE, PHASE_WRITE})
+        self.assertEqual(set(chunks[1]), {PHASE_READ, PHASE_PARSE, PHASE_ENCODE, PHASE_WRITE})
+        self.assertEqual(set(chunks[3]), set(PHASES))
+
+
+if __name__ == "__main__":
+    unittest.main()
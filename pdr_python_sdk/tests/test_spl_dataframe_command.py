@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.spl.spl_binary_columns import decode_binary_columns
+from pdr_python_sdk.spl.spl_dataframe_command import *
+from tests.spl_helpers import *
+
+
+class Scale(SplDataFrameBatchCommand):
+    def dataframe_handle(self, df):
+        self.dtypes = df.dtypes.to_dict()
+        df["scaled"] = df["n"] * 10
+        return df
+
+
+class ScaleDelta(Scale):
+    def __init__(self):
+        super(ScaleDelta, self).__init__()
+        self.delta_output = True
+
+    def config_export_fields(self, export_fields=None):
+        return ["scaled"]
+
+
+class Total(SplDataFrameChunkCommand):
+    def dataframe_handle(self, df):
+        return pd.DataFrame({"rows": [len(df)], "total": [df["n"].sum()]})
+
+
+class TestDataFrameCommandMethods(unittest.TestCase):
+
+    def test_columns_to_dataframe(self):
+        columns = decode_body_columns("i\tf\tb\ts\n1,1\t2,0.5\t4,true\t0,x\n3,\t3,\t3,\t3,")
+        df = columns_to_dataframe(columns)
+        self.assertEqual(str(df["i"].dtype), "Int64")
+        self.assertEqual(df["f"].dtype, np.float64)
+        self.assertEqual(str(df["b"].dtype), "boolean")
+        self.assertTrue(df["i"].isna()[1])
+        self.assertTrue(pd.isna(df["s"][1]))
+        self.assertEqual(convert_body_to_str(dataframe_to_columns(df)), "i\tf\tb\ts\n1\t0.5\tTrue\tx\n\t\t\t")
+
+    def test_batch_command(self):
+        command = Scale()
+        packets = run_command(command, b"n\tname\n1,1\t0,a\n1,2\t0,b", b"n\n1,3")
+        self.assertEqual(command.dtypes["n"], np.int64)
+        self.assertEqual(packets[1][1], "n\tname\tscaled\n1\ta\t10\n2\tb\t20")
+        self.assertEqual(packets[2][1], "n\tscaled\n3\t30")
+
+    def test_batch_command_binary(self):
+        command = Scale()
+        command.binary_body = True
+        packets = run_command(command, [{"n": 1.5}, {"n": 2.5}], text=False,
+                              capabilities=[CAPABILITY_BINARY_COLUMNS])
+        columns = decode_binary_columns(packets[1][1])
+        self.assertEqual(columns["scaled"].tolist(), [15.0, 25.0])
+
+    def test_batch_command_delta_output(self):
+        body = b"n\tname\n" + b"\n".join(b"1,%d\t0,r%d" % (i, i) for i in range(40))
+        command = ScaleDelta()
+        packets = run_command(command, body, capabilities=[CAPABILITY_DELTA_OUTPUT])
+        self.assertEqual(packets[0][0]["output_mode"], CAPABILITY_DELTA_OUTPUT)
+        rows = packets[1][1].split("\n")
+        self.assertEqual(rows[0], "_row\tscaled")
+        self.assertEqual(rows[1:], ["{}\t{}".format(i, i * 10) for i in range(40)])
+
+        command = ScaleDelta()
+        command.worker_processes = 2
+        command.min_rows_per_worker = 10
+        self.assertEqual(run_command(command, body, capabilities=[CAPABILITY_DELTA_OUTPUT])[1:], packets[1:])
+
+        command = Scale()
+        command.delta_output = True
+        self.assertEqual(run_command(command, b"n\n1,1")[1][1], "n\tscaled\n1\t10")
+
+    def test_null_floats_pass_through(self):
+        packets = run_command(SplDataFrameBatchCommand(), b"f\tn\n2,0.5\t1,1\n3,\t1,2")
+        self.assertEqual(packets[1][1], "f\tn\n0.5\t1\n\t2")
+
+    def test_chunk_command(self):
+        packets = run_command(Total(), b"n\n1,1\n1,2", b"", b"n\n1,4")
+        self.assertEqual(packets[1][1], "")
+        self.assertEqual(packets[3][1], "rows\ttotal\n3\t7")
+
+        command = Total()
+        command.memory_budget = 1
+        self.assertEqual(run_command(command, b"n\n1,1\n1,2", b"n\n1,4")[2][1], "rows\ttotal\n3\t7")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,32 @@ class TestClientMethods(unittest.TestCase):
         self.assertEqual(lines[0]["b"], 3)
         self.assertAlmostEqual(lines[0]["c"], 4.5)
 
+    def test_iter_body(self):
+        body = b"a\tb\n0,abc\t1,3\n0,abcd\t1,4\n0,abcde\t1,5"
+        lines = list(iter_body(io.BytesIO(body), len(body), read_size=4))
+        self.assertEqual(lines, parse_body(io.BytesIO(body), len(body)))
+        self.assertEqual(lines[2], {"a": "abcde", "b": 5})
+
+        batches = list(iter_body(io.BytesIO(body), len(body), batch_size=2, read_size=7))
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+
+    def test_iter_body_leaves_next_packet(self):
+        body = b"a\n0,x\n0,y"
+        stream = io.BytesIO(body + b"chunked 1.0,10,20\n")
+        self.assertEqual(len(list(iter_body(stream, len(body), read_size=3))), 2)
+        self.assertEqual(parse_head(stream), (10, 20))
+
+    def test_iter_body_projection(self):
+        body = b"a\tb\tc\n0,abc\t1,3\t0,x\\ty\n0,def"
+        lines = list(iter_body(io.BytesIO(body), len(body), projection={"a"}))
+        self.assertEqual(lines[0], {"a": "abc", "b": "3", "c": "x\\ty"})
+        self.assertIsInstance(lines[0]["c"], SplRawValue)
+        self.assertEqual(lines[1], {"a": "def"})
+        self.assertEqual(convert_body_to_str(lines), "a\tb\tc\nabc\t3\tx\\ty\ndef\t\t")
+
+        lines = list(iter_body(io.BytesIO(body), len(body), compact=True, projection={"b"}, keep_unrequested=False))
+        self.assertEqual([dict(line) for line in lines], [{"b": 3}, {}])
+
     def test_format_field(self):
         self.assertEqual(format_field("{},abc".format(TYPE_STRING)), "abc")
         self.assertEqual(format_field("{},2".format(TYPE_INT)), 2)
@@ -83,9 +109,35 @@ class TestClientMethods(unittest.TestCase):
             }
         ]
         self.assertEqual(len(convert_body_to_str(lines=lines)), len("a\tb\tc\n1\t23\n\t23\t3.0"))
+        self.assertEqual(convert_body_to_str(lines=lines), "a\tb\tc\n1\t23\n\t23\t3.0")
+
+    def test_convert_body_to_str_shared_schema(self):
+        lines = [
+            {"a": 1, "b": "x\ty"},
+            {"b": "z", "a": 2},
+        ]
+        self.assertEqual(convert_body_to_str(lines=lines), "a\tb\n1\tx\\ty\n2\tz")
 
     def test_encode_string(self):
         self.assertEqual(encode_string("\t\n"), "\\t\\n")
 
     def test_decode_string(self):
         self.assertEqual(decode_string("\\t\\n"), "\t\n")
+        self.assertEqual(decode_string("c:\\x"), "c:\\x")
+
+    def test_escape_round_trip(self):
+        set_backslash_escapes(True)
+        try:
+            for value in ["plain", "a\\nb", "a\nb", "\\\t\\", "x\\\\ty\t", ""]:
+                self.assertEqual(decode_string(encode_string(value)), value)
+            self.assertEqual(encode_string("a\\nb"), "a\\\\nb")
+            values = ["a\\n", "b\t", "c"]
+            self.assertEqual(decode_strings(encode_strings(values)), values)
+            self.assertEqual(encode_strings(["x", "y"]), ["x", "y"])
+        finally:
+            set_backslash_escapes(False)
+
+    def test_backslashes_without_escapes(self):
+        self.assertEqual(encode_string("C:\\dir\\file"), "C:\\dir\\file")
+        self.assertEqual(encode_strings(["C:\\dir", "x"]), ["C:\\dir", "x"])
+        self.assertEqual(decode_string("C:\\dir\\file"), "C:\\dir\\file")
@@ -0,0 +1,88 @@
+import unittest
+import glob
+import io
+import os
+import stat
+import tempfile
+
+from pdr_python_sdk.common import RECORD_DIR_ENV
+from pdr_python_sdk.common.recording import open_recording
+from pdr_python_sdk.on_demand_action import run
+from pdr_python_sdk.spl import *
+from pdr_python_sdk.tools.spl_replay import read_packets, replay_file
+from tests.spl_helpers import request
+
+
+class Upper(SplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        for line in lines:
+            line["a"] = line["a"].upper()
+        return lines
+
+
+class Lower(SplStreamingBatchCommand):
+    def streaming_handle(self, lines):
+        for line in lines:
+            line["a"] = line["a"].lower()
+        return lines
+
+
+class TestReplayMethods(unittest.TestCase):
+
+    def test_record_and_replay(self):
+        data = request(b"a\n0,x\n0,y", b"a\n0,Z")
+        with tempfile.TemporaryDirectory() as record_dir:
+            os.environ[RECORD_DIR_ENV] = record_dir
+            try:
+                output = io.BytesIO()
+                run(Upper, ["test", record_dir, record_dir], io.BytesIO(data), output)
+            finally:
+                del os.environ[RECORD_DIR_ENV]
+
+            recordings = glob.glob(os.path.join(record_dir, "*.in"))
+            self.assertEqual(len(recordings), 1)
+            for suffix in (".in", ".out"):
+                mode = os.stat(recordings[0][:-len(".in")] + suffix).st_mode
+                self.assertEqual(stat.S_IMODE(mode), 0o600)
+            with open(recordings[0], "rb") as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(read_packets(output.getvalue())[1][1], "a\nX\nY")
+
+            report = replay_file(Upper(), recordings[0])
+            self.assertEqual(report["packets"], 3)
+            self.assertEqual(report["diffs"], [])
+            self.assertEqual(report["metrics"]["rows_in"], 3)
+
+            report = replay_file(Lower(), recordings[0])
+            self.assertEqual([diff["packet"] for diff in report["diffs"]], [1, 2])
+            self.assertIn("+x", report["diffs"][0]["body"])
+
+    def test_recordings_do_not_overwrite(self):
+        with tempfile.TemporaryDirectory() as record_dir:
+            paths = []
+            for _ in range(2):
+                recorded_input, recorded_output, path = open_recording(io.BytesIO(), io.BytesIO(), record_dir)
+                recorded_input.close()
+                recorded_output.close()
+                paths.append(path)
+            self.assertNotEqual(paths[0], paths[1])
+            self.assertEqual(len(glob.glob(os.path.join(record_dir, "*.out"))), 2)
+
+    def test_replay_binary_columns(self):
+        data = request([{"a": "x", "b": 0.1}, {"a": "\u00ff", "b": 0.2}],
+                       capabilities=[CAPABILITY_BINARY_COLUMNS])
+        output = io.BytesIO()
+        Upper().process_protocol([], io.BytesIO(data), output)
+        self.assertEqual(read_packets(output.getvalue())[1][1], "a\tb\nX\t0.1\n\u0178\t0.2")
+        with tempfile.TemporaryDirectory() as record_dir:
+            path = os.path.join(record_dir, "session")
+            with open(path + ".in", "wb") as f:
+                f.write(data)
+            with open(path + ".out", "wb") as f:
+                f.write(output.getvalue())
+            self.assertEqual(replay_file(Upper(), path)["diffs"], [])
+            self.assertEqual([diff["packet"] for diff in replay_file(Lower(), path)["diffs"]], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
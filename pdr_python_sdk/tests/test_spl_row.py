@@ -0,0 +1,64 @@
+import unittest
+import io
+import pickle
+
+from pdr_python_sdk.spl import *
+
+
+class TestRowMethods(unittest.TestCase):
+
+    def test_row_mapping(self):
+        schema = SplRowSchema(["a", "b"])
+        row = SplRow(schema, ["x", MISSING])
+        self.assertEqual(row["a"], "x")
+        self.assertNotIn("b", row)
+        self.assertEqual(row.get("b", 1), 1)
+        row["b"] = 2
+        row["c"] = 3
+        del row["a"]
+        self.assertEqual(dict(row), {"b": 2, "c": 3})
+        self.assertEqual(len(row), 2)
+        self.assertEqual(row, {"b": 2, "c": 3})
+        self.assertEqual(pickle.loads(pickle.dumps(row)), row)
+        with self.assertRaises(KeyError):
+            row["a"]
+
+    def test_row_copy(self):
+        schema = SplRowSchema(["a", "b"])
+        row = SplRow(schema, ["x", 1])
+        row["c"] = 3
+        copy = row.copy()
+        self.assertIsInstance(copy, SplRow)
+        self.assertIs(copy.schema, schema)
+        copy["a"] = "y"
+        copy["c"] = 4
+        del copy["b"]
+        self.assertEqual(row, {"a": "x", "b": 1, "c": 3})
+        self.assertEqual(copy, {"a": "y", "c": 4})
+
+        lines = list(iter_body(io.BytesIO(b"a\n0,x"), 5, compact=True))
+        copy = lines[0].copy()
+        copy["a"] = "y"
+        self.assertTrue(copy.is_plain(lines[0].schema))
+        self.assertEqual(convert_body_to_str(lines + [copy]), "a\nx\ny")
+
+    def test_compact_parse_body(self):
+        body = b"a\tb\n0,abc\t1,3\n0,abcd"
+        expected = parse_body(io.BytesIO(body), len(body))
+        lines = list(iter_body(io.BytesIO(body), len(body), compact=True))
+        self.assertIsInstance(lines[0], SplRow)
+        self.assertIs(lines[0].schema, lines[1].schema)
+        self.assertEqual([dict(line) for line in lines], expected)
+
+    def test_compact_convert_body_to_str(self):
+        body = b"a\tb\n0,abc\t1,3\n0,ab\\tcd\t1,4"
+        lines = list(iter_body(io.BytesIO(body), len(body), compact=True))
+        expected = convert_body_to_str([dict(line) for line in lines])
+        self.assertEqual(convert_body_to_str(lines), expected)
+        lines[1]["foo"] = "bar"
+        expected = convert_body_to_str([dict(line) for line in lines])
+        self.assertEqual(convert_body_to_str(lines), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
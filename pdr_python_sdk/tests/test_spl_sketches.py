@@ -0,0 +1,93 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pdr_python_sdk.spl.spl_sketches import *
+
+
+class TestSketchesMethods(unittest.TestCase):
+
+    def test_hyperloglog(self):
+        values = np.arange(100000)
+        sketch = HyperLogLog().update(values).update(values[:1000])
+        self.assertLess(abs(sketch.count() - 100000), 3000)
+        self.assertEqual(HyperLogLog().update(["a", "b", None, "a", np.nan]).count(), 2)
+        # ints and their text are the same value
+        self.assertEqual(HyperLogLog().update([1, 2]).update(np.array(["1", "2"], dtype=object)).count(), 2)
+
+        left = HyperLogLog(12).update(values[:60000])
+        right = HyperLogLog(12).update(pd.Series(values[40000:]))
+        merged = HyperLogLog.from_bytes(left.to_bytes()).merge(HyperLogLog.from_bytes(right.to_bytes()))
+        self.assertEqual(merged.count(), HyperLogLog(12).update(values).count())
+        with self.assertRaises(RuntimeError):
+            left.merge(HyperLogLog(10))
+
+    def test_count_min(self):
+        rng = np.random.default_rng(1)
+        values = rng.zipf(1.5, 50000) % 1000
+        sketch = CountMinSketch(width=1024, depth=4).update(values)
+        exact = pd.Series(values).value_counts()
+        estimates = sketch.estimate(exact.index.to_numpy())
+        self.assertTrue((estimates >= exact.to_numpy()).all())
+        self.assertLess((estimates - exact.to_numpy()).max(), 50000 * 3 / 1024)
+        self.assertEqual(sketch.total, 50000)
+
+        weighted = CountMinSketch(width=1024, depth=4).update(["x", "y", None], [5, 2, 7]).add("x")
+        self.assertEqual(weighted.estimate(["x", None, "y"]).tolist(), [6, 0, 2])
+        self.assertEqual(weighted.total, 8)
+
+        half = len(values) // 2
+        merged = CountMinSketch(1024, 4).update(values[:half])
+        merged.merge(CountMinSketch.from_bytes(CountMinSketch(1024, 4).update(values[half:]).to_bytes()))
+        self.assertTrue((merged.table == sketch.table).all())
+
+    def test_space_saving(self):
+        rng = np.random.default_rng(2)
+        values = (rng.zipf(1.3, 100000) % 5000).astype(str)
+        exact = pd.Series(values).value_counts()
+        sketch = SpaceSaving(50)
+        for batch in np.array_split(values, 20):
+            sketch.update(batch)
+        self.assertEqual(sketch.total, 100000)
+        self.assertEqual([value for value, _, _ in sketch.top(5)], exact.index[:5].tolist())
+        for value, count, error in sketch.top(10):
+            self.assertGreaterEqual(count, exact[value])
+            self.assertGreaterEqual(exact[value], count - error)
+
+        left, right = SpaceSaving(50), SpaceSaving(50)
+        for i, batch in enumerate(np.array_split(values, 20)):
+            (left if i % 2 == 0 else right).update(batch)
+        merged = SpaceSaving.from_bytes(left.to_bytes()).merge(SpaceSaving.from_bytes(right.to_bytes()))
+        self.assertEqual(merged.total, 100000)
+        self.assertEqual([value for value, _, _ in merged.top(5)], exact.index[:5].tolist())
+
+        small = SpaceSaving(2).update(["a", "b", "a", None]).add("c", 3)
+        self.assertEqual(small.top(), [("c", 4, 1), ("a", 2, 0)])
+        mixed = SpaceSaving(10).update([1, "1", 2.5, None]).add(1, 2)
+        self.assertEqual(mixed.top(), [("1", 4, 0), ("2.5", 1, 0)])
+
+    def test_kll(self):
+        rng = np.random.default_rng(3)
+        values = rng.normal(size=200000)
+        sketch = KLLSketch(k=200, seed=0)
+        for batch in np.array_split(values, 40):
+            sketch.update(batch)
+        self.assertEqual(sketch.total, 200000)
+        self.assertLess(sum(len(level) for level in sketch.levels), 2000)
+        qs = [0.01, 0.25, 0.5, 0.75, 0.99]
+        for q, estimate in zip(qs, sketch.quantile(qs)):
+            self.assertLess(abs((values <= estimate).mean() - q), 0.02)
+        self.assertLess(abs(sketch.rank(0.0) - 0.5), 0.02)
+        self.assertIsNone(KLLSketch().quantile(0.5))
+        self.assertEqual(KLLSketch().update([3, None, 1, 2, float("nan")]).quantile(0.5), 2.0)
+
+        left = KLLSketch(seed=1).update(values[:100000])
+        right = KLLSketch(seed=2).update(values[100000:])
+        merged = KLLSketch.from_bytes(left.to_bytes()).merge(KLLSketch.from_bytes(right.to_bytes()))
+        self.assertEqual(merged.total, 200000)
+        self.assertLess(abs((values <= merged.quantile(0.9)).mean() - 0.9), 0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+from pdr_python_sdk.spl import *
+from tests.spl_helpers import *
+
+
+def run_window(command, *chunks):
+    """
+    Run command on chunks of records, return the records of every execute response
+    """
+    packets = run_command(command, *[typed_body(lines) for lines in chunks])
+    return [body_records(body) for _, body in packets[1:]]
+
+
+class MovingAverage(SplWindowCommand):
+    def __init__(self):
+        super(MovingAverage, self).__init__()
+        self.window_type = WINDOW_SLIDING
+        self.window_size = 30
+        self.window_slide = 10
+
+    def init_window_state(self):
+        return {"count": 0, "sum": 0}
+
+    def window_add(self, state, row):
+        state["count"] += 1
+        state["sum"] += row["v"]
+
+    def window_remove(self, state, row):
+        state["count"] -= 1
+        state["sum"] -= row["v"]
+
+
+class TestWindowCommandMethods(unittest.TestCase):
+
+    def test_tumbling(self):
+        command = SplWindowCommand()
+        command.window_size = 10
+        command.group_by = ["host"]
+        responses = run_window(command,
+                                [{"_time": 1, "host": "a"}, {"_time": 2, "host": "b"}, {"_time": 5, "host": "a"}],
+                                [{"_time": 12, "host": "a"}, {"_time": 3, "host": "a"}],
+                                [{"_time": 25, "host": "b"}])
+        self.assertEqual(responses[0], [])
+        self.assertEqual(responses[1], [
+            {"host": "a", "_window_start": "0", "_window_end": "10", "count": "2"},
+            {"host": "b", "_window_start": "0", "_window_end": "10", "count": "1"},
+        ])
+        self.assertEqual(responses[2], [
+            {"host": "a", "_window_start": "10", "_window_end": "20", "count": "1"},
+            {"host": "b", "_window_start": "20", "_window_end": "30", "count": "1"},
+        ])
+        self.assertEqual(command.late_rows, 1)
+
+    def test_sliding(self):
+        command = MovingAverage()
+        responses = run_window(command, [{"_time": t, "v": t} for t in (1, 11, 21)],
+                                [{"_time": 31, "v": 31}, {"_time": 95, "v": 95}])
+        windows = [(int(r["_window_end"]), int(r["count"]), int(r["sum"])) for rows in responses for r in rows]
+        self.assertEqual(windows, [(10, 1, 1), (20, 2, 12), (30, 3, 33), (40, 3, 63), (50, 2, 52), (60, 1, 31),
+                                   (100, 1, 95), (110, 1, 95), (120, 1, 95)])
+        self.assertEqual(command.windows.groups, {})
+
+    def test_session(self):
+        command = SplWindowCommand()
+        command.window_type = WINDOW_SESSION
+        command.session_gap = 5
+        responses = run_window(command, [{"_time": 1}, {"_time": 4}, {"_time": 8}],
+                                [{"_time": 20}, {"_time": 22}], [{"_time": 23}])
+        self.assertEqual(responses[0], [])
+        self.assertEqual(responses[1], [{"_window_start": "1", "_window_end": "8", "count": "3"}])
+        self.assertEqual(responses[2], [{"_window_start": "20", "_window_end": "23", "count": "3"}])
+
+    def test_descending(self):
+        rows = [{"_time": t, "v": t, "host": "ab"[t % 2]} for t in (0, 10, 19, 20, 21, 40, 59, 60, 95, 130)]
+        for window_type in (WINDOW_TUMBLING, WINDOW_SLIDING, WINDOW_SESSION):
+            results = []
+            for time_order, chunks in ((TIME_ORDER_ASC, (rows[:4], rows[4:])),
+                                       (TIME_ORDER_DESC, (rows[:5:-1], rows[5::-1]))):
+                command = MovingAverage()
+                command.window_type = window_type
+                command.session_gap = 15
+                command.group_by = ["host"]
+                command.time_order = time_order
+                responses = run_window(command, *chunks)
+                results.append(sorted(tuple(sorted(r.items())) for rows in responses for r in rows))
+                self.assertEqual(command.late_rows, 0)
+            self.assertEqual(results[0], results[1])
+            self.assertGreater(len(results[0]), 3)
+
+    def test_wrong_order_fails(self):
+        command = SplWindowCommand()
+        packets = run_command(command, typed_body([{"_time": t} for t in (300, 240, 180, 120, 60, 0)]))
+        self.assertIn("5 of 6 rows are not in asc _time order", packets[-1][0]["error_message"])
+
+        command = SplWindowCommand()
+        command.time_order = TIME_ORDER_DESC
+        responses = run_window(command, [{"_time": t} for t in (300, 240, 180, 120, 60, 0)])
+        self.assertEqual([int(r["_window_start"]) for r in responses[0]], [300, 240, 180, 120, 60, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+from pdr_python_sdk.storage import *
+from pdr_python_sdk.storage.client import QUERY_PAGE_SIZE, StorageTableData
+from pdr_python_sdk.spl import SplRawValue
+
+
+class FakeService(object):
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, subpath, fields=None):
+        self.requests.append((subpath, fields))
+        return self.responses.pop(0)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStorageLookupMethods(unittest.TestCase):
+
+    def test_query_by_ids(self):
+        path = "/storage/v2/collections/app/data/users"
+        # replies recorded from a server, see _sensitive_test_storage: a query returns its first page, without total
+        service = FakeService({"data": [{"id": 1, "name": "sdk_test1"}]}, {"data": []},
+                              {"data": [{"id": 2, "name": 'say "hi"'}]})
+        data = StorageTableData(service, "/storage/v2/collections/app", "users")
+        self.assertEqual(data.query_by_ids([1, 4]), {"1": {"id": 1, "name": "sdk_test1"}, "4": None})
+        self.assertEqual(service.requests, [(path, {"query": "id=1"}), (path, {"query": "id=4"})])
+        self.assertEqual(list(data.query_by_ids(['say "hi"'], "name")), ['say "hi"'])
+        self.assertEqual(service.requests[-1][1], {"query": 'name="say \\"hi\\""'})
+
+    def test_query_by_ids_batches(self):
+        page = [{"id": i, "group": "a"} for i in range(QUERY_PAGE_SIZE)]
+        # the unpaged reply of a whole table, as recorded, holds its total
+        service = FakeService({"data": [{"id": 20, "group": "b"}], "total": 1},
+                              {"data": page, "total": 12}, {"data": [{"id": 11, "group": "c"}], "total": 1},
+                              {"data": []})
+        data = StorageTableData(service, "/storage/v2/collections/app", "users")
+        self.assertEqual(data.query_by_ids(["b", "x", "a", "c", "d"], "group", batch_size=2),
+                         {"b": {"id": 20, "group": "b"}, "x": None, "a": page[0], "c": {"id": 11, "group": "c"},
+                          "d": None})
+        # a full page may have cut c off, it is looked up on its own
+        self.assertEqual([fields["query"] for _, fields in service.requests],
+                         ['group="b" or group="x"', 'group="a" or group="c"', 'group="c"', 'group="d"'])
+        service.responses.extend([{"data": []}] * 3)
+        data.query_by_ids(list(range(30)), batch_size=500)
+        self.assertEqual(service.requests[-1][1]["query"].count(" or "), QUERY_PAGE_SIZE - 1)
+
+    def test_cache(self):
+        clock = FakeClock()
+        cache = LookupCache(max_size=2, ttl=10, clock=clock)
+        cache.put_many({"a": 1, "b": None})
+        self.assertEqual(cache.get_many(["a", "b", "c"]), ({"a": 1, "b": None}, ["c"]))
+        cache.put_many({"c": 3})
+        # a was used less recently than b
+        self.assertEqual(cache.get_many(["a", "b"]), ({"b": None}, ["a"]))
+        clock.now = 10
+        self.assertEqual(cache.get_many(["b", "c"]), ({}, ["b", "c"]))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (3, 4))
+
+    def test_enrich(self):
+        fetched = []
+
+        def fetch(keys):
+            fetched.append(keys)
+            records = {str(key): {"id": key, "name": "user{}".format(key)} for key in keys if key < 8}
+            records["9"] = None
+            return records
+
+        lookup = StorageLookup(fetch=fetch, ttl=None)
+        chunk = [{"uid": 1}, {"uid": "1"}, {"uid": SplRawValue("2")}, {"uid": 9}, {"uid": 8}, {"uid": None},
+                 {"uid": "x"}, {}]
+        lookup.enrich(chunk, "uid")
+        # ids are queried as numbers
+        self.assertEqual(fetched, [[1, 2, 9, 8]])
+        self.assertEqual(chunk, [{"uid": 1, "name": "user1"}, {"uid": "1", "name": "user1"},
+                                 {"uid": "2", "name": "user2"}, {"uid": 9}, {"uid": 8}, {"uid": None},
+                                 {"uid": "x"}, {}])
+
+        chunk = [{"uid": 2}, {"uid": 9}, {"uid": 3}, {"uid": 8}]
+        lookup.enrich(chunk, "uid", fields=["id", "name"], prefix="user_")
+        # 9 has no record, 8 was left out of the fetch result and is fetched again
+        self.assertEqual(fetched, [[1, 2, 9, 8], [3, 8]])
+        self.assertEqual(chunk[2], {"uid": 3, "user_id": 3, "user_name": "user3"})
+        self.assertEqual(chunk[1], {"uid": 9})
+
+        lookup.enrich([{"uid": 1}, {"uid": 3}], "uid")
+        self.assertEqual(lookup.fetches, 2)
+        with self.assertRaises(Exception):
+            StorageLookup()
+
+        names = StorageLookup(fetch=lambda keys: {str(key): {"name": key} for key in keys}, key_field="name")
+        self.assertIsNone(names.key_type)
+        self.assertEqual(names.enrich([{"n": 1}], "n", fields=["name"], prefix="x"), [{"n": 1, "xname": 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()